@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+
+def calculate_duration(data):
+    """Vectorized Duration column: -99 for invalid attack dates, the number of
+    days until resolution for extended events, and 1 otherwise."""
+    attack_date = pd.to_datetime(
+        pd.DataFrame({'year': data['Year'], 'month': data['Month'], 'day': data['Day']}),
+        errors='coerce'
+    )
+    resolution_date = pd.to_datetime(data['Resolution'], format="%m/%d/%Y", errors='coerce')
+
+    days = (resolution_date - attack_date).dt.days
+    resolved = (data['Extended'] == 1).to_numpy() & days.notna().to_numpy()
+
+    duration = np.where(resolved, days.fillna(0).to_numpy(dtype=np.int64), 1)
+    duration = np.where(attack_date.isna().to_numpy(), -99, duration)
+    return pd.Series(duration, index=data.index, name='Duration')
+
+
+def calculate_casualties(data):
+    """Vectorized Number of Casualties column: killed + wounded, or -99 when either is missing."""
+    killed = data['Number of Killed People'].to_numpy(dtype=np.float64)
+    wounded = data['Number of Wounded People'].to_numpy(dtype=np.float64)
+
+    casualties = np.where(np.isnan(killed) | np.isnan(wounded), -99, killed + wounded)
+    return pd.Series(casualties, index=data.index, name='Number of Casualties')
@@ -0,0 +1,160 @@
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+
+def unique_points(points):
+    """Collapse duplicate rows: returns the unique points, the inverse index that maps
+    every original row to its unique point, and the multiplicity of each unique point."""
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    unique, inverse, counts = np.unique(points, axis=0, return_inverse=True, return_counts=True)
+    return unique, inverse.reshape(-1), counts
+
+
+class KNNOutlierScorer:
+    """k-th nearest neighbour distance scores built on a single tree index.
+
+    Duplicate points are collapsed into weighted unique points, every k is answered
+    from one `kneighbors(max_k + 1)` query, and queries are streamed in batches so
+    the full distance matrix is never materialised. Scores match fitting
+    `NearestNeighbors(n_neighbors=k + 1)` on all rows and taking the last distance
+    of `kneighbors` (the point itself counts as its own first neighbour).
+    """
+
+    def __init__(self, algorithm='kd_tree', leaf_size=40, batch_size=100_000, n_jobs=None):
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
+    def fit(self, points):
+        self.unique_, self.inverse_, self.counts_ = unique_points(points)
+        self.index_ = NearestNeighbors(algorithm=self.algorithm, leaf_size=self.leaf_size, n_jobs=self.n_jobs)
+        self.index_.fit(self.unique_)
+        return self
+
+    def unique_kth_distances(self, k_values):
+        """k-th neighbour distance of every unique point for each k, from one query per batch."""
+        k_values = list(k_values)
+        n_unique = len(self.unique_)
+        n_neighbors = min(max(k_values) + 1, n_unique)
+        distances = {k: np.full(n_unique, np.nan) for k in k_values}
+
+        for start in range(0, n_unique, self.batch_size):
+            batch = slice(start, start + self.batch_size)
+            batch_distances, batch_indices = self.index_.kneighbors(self.unique_[batch], n_neighbors=n_neighbors)
+            cumulative_counts = np.cumsum(self.counts_[batch_indices], axis=1)
+            rows = np.arange(len(batch_distances))
+
+            for k in k_values:
+                position = (cumulative_counts < k + 1).sum(axis=1)
+                found = position < n_neighbors
+                distances[k][batch][found] = batch_distances[rows[found], position[found]]
+        return distances
+
+    def kth_distances(self, k_values):
+        """k-th neighbour distance of every original row for each k."""
+        return {k: distances[self.inverse_] for k, distances in self.unique_kth_distances(k_values).items()}
+
+    def top_n(self, k, n=5):
+        """Positions of the n rows with the largest k-th neighbour distance, computed on
+        the unique points and expanded only for the winners."""
+        unique_distances = self.unique_kth_distances([k])[k]
+        order = np.argsort(-np.nan_to_num(unique_distances, nan=-np.inf), kind='stable')
+        covered = np.searchsorted(np.cumsum(self.counts_[order]), n) + 1
+        winners = order[:covered]
+
+        rows = np.flatnonzero(np.isin(self.inverse_, winners))
+        rows = rows[np.argsort(-unique_distances[self.inverse_[rows]], kind='stable')]
+        return rows[:n], unique_distances[self.inverse_[rows[:n]]]
+
+
+# sklearn's LocalOutlierFactor threshold for contamination='auto'
+LOF_OFFSET = -1.5
+
+def weighted_local_outlier_factor(points, n_neighbors=20):
+    """LocalOutlierFactor(n_neighbors).fit_predict computed on the unique points.
+
+    Each unique point stands for all of its duplicates: a row's neighbourhood is
+    its other duplicates plus the nearest unique points, weighted by multiplicity
+    up to exactly `n_neighbors` rows. Returns the labels (-1 for outliers) and
+    the outlier factors (-negative_outlier_factor_) for every original row.
+
+    When several unique points tie at a row's k-distance and only some of their
+    rows fit in the neighbourhood, sklearn keeps whichever rows its tree search
+    meets first. Where those tied points have different reachability distances
+    or densities the result depends on that choice, so those rows are scored by
+    `_tied_rows_lof` from the neighbours sklearn's own search returns.
+    """
+    unique, inverse, counts = unique_points(points)
+    k = max(1, min(n_neighbors, counts.sum() - 1))
+    # One unique point past the neighbourhood shows whether the tie at the k-distance goes on
+    n_query = min(k + 2, len(unique))
+
+    index = NearestNeighbors(algorithm='kd_tree').fit(unique)
+    distances, indices = index.kneighbors(unique, n_neighbors=n_query)
+
+    # Rows available at each neighbour position; a row is never its own neighbour
+    weights = counts[indices]
+    weights[indices == np.arange(len(unique))[:, None]] -= 1
+    cumulative = np.cumsum(weights, axis=1)
+    used = np.clip(k - (cumulative - weights), 0, weights)
+
+    rows = np.arange(len(unique))
+    k_distance = distances[rows, (cumulative < k).sum(axis=1)]
+
+    reach_distance = np.maximum(distances, k_distance[indices])
+    lrd = 1.0 / ((used * reach_distance).sum(axis=1) / k + 1e-10)
+    outlier_factor = (used * lrd[indices]).sum(axis=1) / k / lrd
+
+    # Boundary ties that leave rows of several unique points out, and whether the choice matters
+    tied = (distances == k_distance[:, None]) & (weights > 0)
+    straddles = (tied.sum(axis=1) > 1) & (tied & (used < weights)).any(axis=1)
+    open_ended = straddles & tied[:, -1] & (n_query < len(unique))
+
+    def differs(values):
+        return np.where(tied, values, -np.inf).max(axis=1) != np.where(tied, values, np.inf).min(axis=1)
+
+    ambiguous_lrd = straddles & (differs(reach_distance) | open_ended)
+    ambiguous = (ambiguous_lrd | ((used > 0) & ambiguous_lrd[indices]).any(axis=1)
+                 | (straddles & (differs(lrd[indices]) | (tied & ambiguous_lrd[indices]).any(axis=1))))
+    outlier_factor = outlier_factor[inverse]
+    if ambiguous.any():
+        rows = np.flatnonzero(ambiguous[inverse])
+        outlier_factor[rows] = _tied_rows_lof(points, rows, n_neighbors, k, k_distance[inverse], lrd[inverse])
+
+    labels = np.where(-outlier_factor < LOF_OFFSET, -1, 1)
+    return labels, outlier_factor
+
+def _tied_rows_lof(points, rows, n_neighbors, k, k_distance, lrd):
+    """Outlier factors of `rows` as LocalOutlierFactor computes them, from the neighbours its kneighbors
+    query returns on a tree built the same way over all rows. `k_distance` and `lrd` hold every row's
+    values from the unique points; the densities of `rows` are recomputed from their own neighbours."""
+    from sklearn.neighbors import LocalOutlierFactor
+
+    points = np.asarray(points, dtype=np.float64)
+    index = NearestNeighbors(n_neighbors=n_neighbors).fit(points)
+    if index._fit_method == 'brute':
+        # The brute-force search may split ties differently for a subset of queries; score all rows
+        lof = LocalOutlierFactor(n_neighbors=n_neighbors).fit(points)
+        return -lof.negative_outlier_factor_[rows]
+
+    distances, neighbours = index.kneighbors(points[rows], n_neighbors=k + 1)
+    # Drop the row itself as kneighbors() does for the training rows (the first column if duplicates crowd it out)
+    keep = neighbours != rows[:, None]
+    keep[keep.all(axis=1), 0] = False
+    distances, neighbours = distances[keep].reshape(len(rows), k), neighbours[keep].reshape(len(rows), k)
+
+    lrd = lrd.copy()
+    lrd[rows] = 1.0 / (np.mean(np.maximum(distances, k_distance[neighbours]), axis=1) + 1e-10)
+    return np.mean(lrd[neighbours] / lrd[rows][:, None], axis=1)
+
+def weighted_dbscan_labels(points, eps=0.5, min_samples=5, inverse=None, counts=None):
+    """DBSCAN labels for every row, clustering only the unique points with their
+    multiplicities as `sample_weight`. Core and noise points are the same as running
+    DBSCAN on all rows. Pass `inverse` and `counts` when `points` are already the
+    unique rows (for example a sparse matrix from `build_feature_matrix`)."""
+    if counts is None:
+        points, inverse, counts = unique_points(points)
+    labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(points, sample_weight=counts)
+    return labels[inverse]
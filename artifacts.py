@@ -0,0 +1,144 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Also export CSV next to the Parquet files, equivalent to the --export-csv flag
+EXPORT_CSV_ENV = 'GTD_EXPORT_CSV'
+
+
+def _arrow_table(frame, schema=None):
+    """Arrow table of a frame, with categoricals stored as their labels so chunks of one artifact share a schema."""
+    frame = frame.astype({col: frame[col].cat.categories.dtype for col in frame.columns
+                          if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+def stream_schema(table):
+    """Schema for a file written chunk by chunk, taken from its first chunk. Columns that are
+    entirely missing in that chunk have Arrow's null type; they are typed as strings (text
+    columns are the only ones read as object) so later chunks with values still fit."""
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                      for field in table.schema], metadata=table.schema.metadata)
+
+def _partial(path):
+    """Where `path` is written before being renamed into place, so an interrupted write never
+    leaves a truncated file under the artifact's name."""
+    return f'{path}.partial'
+
+def write_parquet(table, path, compression='zstd'):
+    pq.write_table(table, _partial(path), compression=compression)
+    os.replace(_partial(path), path)
+
+def write_csv(table, path, null_string=''):
+    """CSV through Arrow's C++ writer, which runs without the GIL and so alongside other writes and stages."""
+    pa_csv.write_csv(table, _partial(path), pa_csv.WriteOptions(quoting_style='needed', null_string=null_string))
+    os.replace(_partial(path), path)
+
+def _remove(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ArtifactStore:
+    """Persists the frames the stages produce, in background threads.
+
+    Stages hand frames to each other in memory; the files are outputs only, so
+    `save` returns as soon as the write is queued and the next stage runs while
+    it is written. Every artifact is written as zstd-compressed Parquet, and
+    with `export_csv` also as CSV by Arrow's writer. Arrow releases the GIL while
+    encoding, so several artifacts are written in parallel. `wait` blocks until
+    all queued writes are done and raises the first error.
+    """
+
+    def __init__(self, export_csv=False, max_workers=4, compression='zstd'):
+        self.export_csv = export_csv
+        self.compression = compression
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artifacts')
+        self.futures = []
+
+    @classmethod
+    def from_env(cls, export_csv=False, **options):
+        return cls(export_csv or os.environ.get(EXPORT_CSV_ENV, '') not in ('', '0'), **options)
+
+    def paths(self, name):
+        """Files written for the artifact `name` (a path without extension)."""
+        return [f'{name}.parquet'] + ([f'{name}.csv'] if self.export_csv else [])
+
+    def _write(self, frame, name, null_string):
+        table = _arrow_table(frame)
+        write_parquet(table, f'{name}.parquet', self.compression)
+        if self.export_csv:
+            write_csv(table, f'{name}.csv', null_string)
+
+    def save(self, frame, name, null_string=''):
+        """Queue `frame` to be written as `name`; returns the paths it will be written to.
+        Missing values stay nulls in Parquet and are written as `null_string` in the CSV export.
+
+        The previous files are removed first, so until the write completes the
+        artifact is missing (and its stage not cached) rather than stale.
+        """
+        _remove(self.paths(name))
+        self.futures.append(self.executor.submit(self._write, frame, name, null_string))
+        return self.paths(name)
+
+    def writer(self, name):
+        """An `ArtifactWriter` that appends chunks to the artifact `name`."""
+        return ArtifactWriter(name, self.export_csv, self.compression)
+
+    def wait(self):
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+
+class ArtifactWriter:
+    """Writes an artifact chunk by chunk: one Parquet row group and one CSV block per chunk."""
+
+    def __init__(self, name, export_csv=False, compression='zstd'):
+        self.name = name
+        self.export_csv = export_csv
+        self.compression = compression
+        self.rows = 0
+        self.schema = None
+        self.parquet = self.csv = None
+        _remove(self.paths())
+
+    def paths(self):
+        return [f'{self.name}.parquet'] + ([f'{self.name}.csv'] if self.export_csv else [])
+
+    def write(self, chunk):
+        table = _arrow_table(chunk, self.schema)
+        if self.schema is None:
+            self.schema = stream_schema(table)
+            table = table.cast(self.schema)
+            self.parquet = pq.ParquetWriter(_partial(f'{self.name}.parquet'), self.schema, compression=self.compression)
+            if self.export_csv:
+                self.csv = pa_csv.CSVWriter(_partial(f'{self.name}.csv'), self.schema,
+                                            write_options=pa_csv.WriteOptions(quoting_style='needed'))
+        self.parquet.write_table(table)
+        if self.csv is not None:
+            self.csv.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        """Finish the files and move them into place; returns their paths."""
+        for writer, path in zip((self.parquet, self.csv), self.paths()):
+            if writer is not None:
+                writer.close()
+                os.replace(_partial(path), path)
+        return self.paths()
+
+
+# Store used by the pipeline stages; replaced by cli.py's command line options
+store = ArtifactStore.from_env()
+
+def configure(export_csv=False, max_workers=4):
+    """Replace the module store (after waiting for the writes queued on the old one)."""
+    global store
+    store.wait()
+    store = ArtifactStore.from_env(export_csv, max_workers=max_workers)
+    return store
@@ -0,0 +1,453 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils import CACHE_DIR, DATASET_DTYPES, apply_dataset_schema
+from aggregation import calculate_duration, calculate_casualties
+from sampling import stratified_sample
+from statistical_outliers import group_codes, group_statistics, grouped_z_scores, generalized_esd, esd_critical_values
+from synthetic_data import SyntheticGTD, write_synthetic_dataset
+from rules import load_rule_sets
+from cube import AggregateCube
+import artifacts
+from preprocessing import (DATASET_ZIP, RULES_JSON, build_pipeline, derive_columns, selected_columns, feature_columns,
+                           density_combo, clustering_combo, pca_numeric_columns, pca_scale_columns)
+from preprocess_gdp_dataset import MADDISON_ZIP, WORLD_BANK_ZIP
+from instrumentation import StageRecorder
+
+
+# --- Row-wise reference implementations (previous preprocessing.py path) ---
+def is_valid_date(year, month, day):
+    """Check if the given year, month, day form a valid date."""
+    try:
+        datetime(year, month, day)
+        return True
+    except ValueError:
+        return False
+
+def calculate_duration_rowwise(row):
+    if not is_valid_date(row['Year'], row['Month'], row['Day']):
+        return -99
+
+    if row['Extended'] == 1 and pd.notnull(row['Resolution']):
+        attack_date = datetime(row['Year'], row['Month'], row['Day'])
+        try:
+            resolution_date = datetime.strptime(row['Resolution'], "%m/%d/%Y")
+            return (resolution_date - attack_date).days
+        except ValueError:
+            return 1
+    return 1
+
+def calculate_casualties_rowwise(row):
+    if pd.isnull(row['Number of Killed People']) or pd.isnull(row['Number of Wounded People']):
+        return -99
+    return row['Number of Killed People'] + row['Number of Wounded People']
+
+
+def generalized_esd_loop(values, max_outliers=10, alpha=0.05):
+    """Textbook generalized ESD for one group: Grubbs' test repeated on the remaining values."""
+    remaining = pd.Series(values)
+    removed, exceeded = [], 0
+    for step in range(max_outliers):
+        n = len(remaining)
+        std = remaining.std()
+        if n < 3 or not std > 0:
+            break
+        deviation = (remaining - remaining.mean()).abs()
+        index = deviation.idxmax()
+        if deviation[index] / std > esd_critical_values(n, alpha):
+            exceeded = step + 1
+        removed.append(index)
+        remaining = remaining.drop(index)
+    return removed[:exceeded]
+
+
+def make_aggregation_frame(n_rows, seed=0):
+    """Small frame with the columns used by the aggregated-column stage, including
+    unknown days (0), extended events and malformed resolution dates."""
+    rng = np.random.default_rng(seed)
+    year = rng.integers(1970, 2018, n_rows)
+    month = rng.integers(0, 13, n_rows)
+    day = rng.integers(0, 32, n_rows)
+    extended = (rng.random(n_rows) < 0.05).astype(np.int64)
+
+    offsets = pd.to_timedelta(rng.integers(-5, 400, n_rows), unit='D')
+    resolution = (pd.Timestamp('1970-01-01') + pd.to_timedelta((year - 1970) * 365, unit='D') + offsets)
+    resolution = pd.Series(resolution.strftime('%m/%d/%Y'), dtype=object)
+    resolution[rng.random(n_rows) < 0.3] = None
+    resolution[rng.random(n_rows) < 0.02] = '02/30/2001'
+
+    killed = rng.poisson(2, n_rows).astype(np.float64)
+    killed[rng.random(n_rows) < 0.06] = np.nan
+    wounded = rng.poisson(3, n_rows).astype(np.float64)
+    wounded[rng.random(n_rows) < 0.09] = np.nan
+
+    return pd.DataFrame({
+        'Year': year, 'Month': month, 'Day': day, 'Extended': extended,
+        'Resolution': resolution, 'Number of Killed People': killed,
+        'Number of Wounded People': wounded
+    })
+
+
+def benchmark_aggregated_columns(n_rows=180_000):
+    data = make_aggregation_frame(n_rows)
+
+    start = time.perf_counter()
+    duration_rowwise = data.apply(calculate_duration_rowwise, axis=1)
+    casualties_rowwise = data.apply(calculate_casualties_rowwise, axis=1)
+    rowwise_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    duration = calculate_duration(data)
+    casualties = calculate_casualties(data)
+    vectorized_seconds = time.perf_counter() - start
+
+    pd.testing.assert_series_equal(duration, duration_rowwise, check_names=False, check_dtype=False)
+    pd.testing.assert_series_equal(casualties, casualties_rowwise, check_names=False, check_dtype=False)
+
+    print(f"Aggregated columns ({n_rows} rows): row-wise {rowwise_seconds:.3f}s, "
+          f"vectorized {vectorized_seconds:.3f}s ({rowwise_seconds / vectorized_seconds:.0f}x)")
+
+
+def benchmark_stratified_sampling(n_rows=180_000, sampling_fraction=0.1):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'Decade': rng.integers(197, 202, n_rows) * 10,
+        'Region': pd.Categorical(rng.choice([f'Region {i}' for i in range(12)], n_rows)),
+        'Country': rng.integers(0, 200, n_rows)
+    })
+    columns = list(data.columns)
+
+    for by in [['Decade', 'Region'], ['Decade', 'Region', 'Country']]:
+        start = time.perf_counter()
+        sampled_apply = data.groupby(by, observed=True, group_keys=False)[columns].apply(
+            lambda x: x.sample(frac=sampling_fraction, random_state=1)).reset_index(drop=True)
+        apply_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sampled = stratified_sample(data, by, frac=sampling_fraction, random_state=1)
+        vectorized_seconds = time.perf_counter() - start
+
+        # Different random draws, but the same strata sizes in the same order
+        assert (sampled[by].to_numpy() == sampled_apply[by].to_numpy()).all()
+
+        print(f"Stratified sampling by {by} ({n_rows} rows): groupby.apply {apply_seconds:.3f}s, "
+              f"vectorized {vectorized_seconds:.3f}s ({apply_seconds / vectorized_seconds:.0f}x)")
+
+
+def benchmark_statistical_outliers(n_rows=180_000, by=('Region', 'Decade', 'Country')):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'Region': rng.integers(0, 12, n_rows),
+        'Decade': rng.integers(197, 202, n_rows) * 10,
+        'Country': rng.integers(0, 40, n_rows),
+        'Number of Wounded People': rng.negative_binomial(1, 0.2, n_rows).astype(np.float64)
+    })
+    column = data['Number of Wounded People']
+    groups = data.groupby(list(by), sort=True)[column.name]
+
+    start = time.perf_counter()
+    z_loop = pd.concat([(values - values.mean()) / values.std() for _, values in groups]).sort_index()
+    esd_loop = sorted(index for _, values in groups for index in generalized_esd_loop(values))
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    codes = group_codes(data, by)
+    z_scores = grouped_z_scores(column, codes)
+    outliers, _ = generalized_esd(column, codes)
+    vectorized_seconds = time.perf_counter() - start
+
+    np.testing.assert_allclose(z_scores, z_loop.to_numpy(), rtol=1e-9)
+    assert np.flatnonzero(outliers).tolist() == esd_loop
+    stats = group_statistics(column, codes)
+    np.testing.assert_allclose(stats['median'], groups.median().to_numpy())
+    np.testing.assert_allclose(stats['mad'], groups.apply(lambda x: (x - x.median()).abs().median()).to_numpy())
+
+    print(f"Z-score and generalized ESD per {list(by)} ({n_rows} rows, {codes.max() + 1} groups): "
+          f"per-group loop {loop_seconds:.3f}s, vectorized {vectorized_seconds:.3f}s "
+          f"({loop_seconds / vectorized_seconds:.0f}x), {outliers.sum()} ESD outliers")
+
+
+def make_rule_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    weapons = ['Chemical', 'Explosives', 'Melee', 'Fake Weapons', 'Firearms', 'Incendiary', 'Unknown']
+    attacks = ['Armed Assault', 'Unarmed Assault', 'Bombing/Explosion', 'Facility/Infrastructure Attack',
+               'Assassination', 'Hostage Taking (Kidnapping)', 'Unknown']
+    groups = [f'Group {i:04d}' for i in range(3000)] + ['Kosovo Liberation Army (KLA)', 'KLA', 'Unknown']
+    return pd.DataFrame({
+        'Attacking Group Name': pd.Categorical(rng.choice(groups, n_rows)),
+        'Weapon Type': pd.Categorical(rng.choice(weapons, n_rows)),
+        'Attack Type': pd.Categorical(rng.choice(attacks, n_rows)),
+        'Duration': rng.choice([-99, 0, 1, 2, 30, 7324, -5], n_rows),
+    })
+
+
+def benchmark_rule_engine(n_rows=180_000):
+    rule_sets = load_rule_sets(RULES_JSON)
+    text_columns = ['Attacking Group Name', 'Weapon Type', 'Attack Type']
+
+    for dtype in ['category', 'object']:
+        data = make_rule_frame(n_rows).astype({col: dtype for col in text_columns})
+
+        start = time.perf_counter()
+        contextual = data[~data['Attacking Group Name'].str.contains("KLA", na=False)]
+        cleaned = contextual[((contextual['Duration'] >= 1) | (contextual['Duration'] == -99)) & (contextual['Duration'] != 7324)]
+        W, A = cleaned['Weapon Type'], cleaned['Attack Type']
+        cleaned = cleaned[~(((W == 'Chemical') & (A == 'Armed Assault')) | ((W == 'Explosives') & (A == 'Unarmed Assault')) |
+                            ((W == 'Melee') & (A == 'Bombing/Explosion')) | ((W == 'Fake Weapons') & (A == 'Bombing/Explosion')) |
+                            ((W == 'Fake Weapons') & (A == 'Facility/Infrastructure')))]
+        masks_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        contextual_rules, _ = rule_sets['contextual'].apply(data)
+        cleaned_rules, hits = rule_sets['cleaning'].apply(contextual_rules)
+        rules_seconds = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(contextual_rules, contextual)
+        pd.testing.assert_frame_equal(cleaned_rules, cleaned)
+
+        print(f"Contextual and cleaning rules ({n_rows} rows, {dtype} columns): chained masks {masks_seconds:.3f}s, "
+              f"compiled rules {rules_seconds:.3f}s ({masks_seconds / rules_seconds:.1f}x), hits {hits.to_dict()}")
+
+def benchmark_aggregate_cube(scale=1.0):
+    raw = pd.concat(SyntheticGTD(scale).chunks(), ignore_index=True)[selected_columns]
+    events = derive_columns(apply_dataset_schema(raw.astype({col: DATASET_DTYPES[col] for col in selected_columns})))
+    events['Decade'] = (events['Year'] // 10) * 10
+    killed = events['Number of Killed People']
+
+    start = time.perf_counter()
+    cube = AggregateCube.from_events(events)
+    build_seconds = time.perf_counter() - start
+
+    # The notebooks' groupbys on the events, and the same figures from the cube
+    queries = [
+        ('attacks per decade', lambda: events.groupby('Decade').size(),
+         lambda: cube.query('Decade', ['Attacks'])['Attacks']),
+        ('success rate per decade', lambda: events.groupby('Decade')['Success'].mean(),
+         lambda: cube.query('Decade', ['Success'])['Success Rate']),
+        ('killed per decade and region', lambda: events[killed >= 0].groupby(['Decade', 'Region'], observed=True)[killed.name].sum(),
+         lambda: cube.query(['Decade', 'Region'], ['Killed'])['Killed']),
+        ('region x attack type crosstab', lambda: pd.crosstab(events['Region'], events['Attack Type']),
+         lambda: cube.crosstab('Region', 'Attack Type')),
+    ]
+    for name, on_events, on_cube in queries:
+        start = time.perf_counter()
+        expected = on_events()
+        events_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = on_cube()
+        cube_seconds = time.perf_counter() - start
+
+        np.testing.assert_allclose(np.asarray(result, dtype=np.float64), np.asarray(expected, dtype=np.float64))
+        print(f"Cube query '{name}' ({len(events)} events, {len(cube.cells)} cells): events {events_seconds * 1000:.1f}ms, "
+              f"cube {cube_seconds * 1000:.1f}ms")
+    print(f"Cube built in {build_seconds:.3f}s")
+
+
+def benchmark_anomaly_detectors(scale=0.2, k_values=(1, 20), n_neighbors=20, dbscan_rows=5_000):
+    """The unique-point kNN, LOF and DBSCAN detectors and the sparse PCA features, against sklearn
+    on every row and the dense get_dummies path, on synthetic data (the detectors' stage inputs)."""
+    from sklearn.cluster import DBSCAN
+    from sklearn.decomposition import PCA
+    from sklearn.neighbors import LocalOutlierFactor, NearestNeighbors
+    from sklearn.preprocessing import StandardScaler
+    from anomaly_detection import KNNOutlierScorer, weighted_dbscan_labels, weighted_local_outlier_factor
+    from features import build_feature_matrix
+
+    categorical_columns = ['attacktype1', 'weaptype1']
+    columns = list(dict.fromkeys(selected_columns + categorical_columns))
+    raw = pd.concat(SyntheticGTD(scale).chunks(), ignore_index=True)[columns]
+    raw = apply_dataset_schema(raw.astype({col: DATASET_DTYPES[col] for col in columns}))
+    events = derive_columns(raw)
+
+    # kNN: k-th neighbour distance of every row (the row itself is its first neighbour)
+    points = StandardScaler().fit_transform(events[feature_columns].replace(-99, np.nan).dropna())
+    start = time.perf_counter()
+    distances = KNNOutlierScorer().fit(points).kth_distances(k_values)
+    unique_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = {k: NearestNeighbors(n_neighbors=k + 1).fit(points).kneighbors(points)[0][:, -1] for k in k_values}
+    rows_seconds = time.perf_counter() - start
+    for k in k_values:
+        np.testing.assert_allclose(distances[k], expected[k], rtol=1e-12)
+    print(f"kNN distances for k in {list(k_values)} ({len(points)} rows): all rows {rows_seconds:.3f}s, "
+          f"unique points {unique_seconds:.3f}s")
+
+    # LOF on the (killed, duration) rows, ties at the k-distance included
+    valid = events[(events[density_combo] != -99).all(axis=1)][density_combo].dropna()
+    start = time.perf_counter()
+    labels, factors = weighted_local_outlier_factor(valid, n_neighbors)
+    unique_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    lof = LocalOutlierFactor(n_neighbors=n_neighbors)
+    expected_labels = lof.fit_predict(valid.to_numpy(dtype=np.float64))
+    rows_seconds = time.perf_counter() - start
+    assert (labels == expected_labels).all()
+    np.testing.assert_allclose(factors, -lof.negative_outlier_factor_, rtol=1e-9)
+    print(f"LOF ({len(valid)} rows, {(labels == -1).sum()} outliers): all rows {rows_seconds:.3f}s, "
+          f"unique points {unique_seconds:.3f}s")
+
+    # DBSCAN on the one-hot weapon and attack types: the same noise rows
+    data = events[clustering_combo].dropna().head(dbscan_rows)
+    start = time.perf_counter()
+    unique_features, _, inverse, counts = build_feature_matrix(data, categorical_columns=clustering_combo, deduplicate=True)
+    labels = weighted_dbscan_labels(unique_features, 0.8, 10, inverse, counts)
+    unique_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected_labels = DBSCAN(eps=0.8, min_samples=10).fit_predict(pd.get_dummies(data).to_numpy(dtype=np.float64))
+    rows_seconds = time.perf_counter() - start
+    assert ((labels == -1) == (expected_labels == -1)).all()
+    print(f"DBSCAN ({len(data)} rows, {(labels == -1).sum()} noise): all rows {rows_seconds:.3f}s, "
+          f"unique points {unique_seconds:.3f}s")
+
+    # PCA: sparse one-hot features against the dense get_dummies frame on string codes
+    start = time.perf_counter()
+    dense = raw[pca_numeric_columns].astype(np.float64)
+    dense = dense.mask(dense < 0)
+    dense = dense.fillna(dense.median())
+    dense[pca_scale_columns] = StandardScaler().fit_transform(dense[pca_scale_columns])
+    dense = pd.concat([dense, pd.get_dummies(raw[categorical_columns].astype(str), drop_first=True)], axis=1)
+    dense_pca = PCA(n_components=2)
+    expected = dense_pca.fit_transform(dense.to_numpy(dtype=np.float64))
+    dense_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    features, _ = build_feature_matrix(raw, pca_numeric_columns, categorical_columns, pca_scale_columns, drop_first=True)
+    sparse_pca = PCA(n_components=2, svd_solver='covariance_eigh')
+    reduced = sparse_pca.fit_transform(features)
+    sparse_seconds = time.perf_counter() - start
+    np.testing.assert_allclose(sparse_pca.explained_variance_ratio_, dense_pca.explained_variance_ratio_, rtol=1e-9)
+    np.testing.assert_allclose(np.abs(reduced), np.abs(expected), atol=1e-8)
+    print(f"PCA features ({len(raw)} rows, {features.shape[1]} columns): dense get_dummies {dense_seconds:.3f}s, "
+          f"sparse {sparse_seconds:.3f}s")
+
+
+# --- Stage benchmarks on synthetic data ---
+BENCHMARK_DIR = os.path.join(CACHE_DIR, 'benchmark')
+BENCHMARK_RESULTS = 'benchmark_results.json'
+INPUT_FILES = [MADDISON_ZIP, WORLD_BANK_ZIP, RULES_JSON]
+
+def prepare_benchmark_dir(scale, seed=0):
+    """Working directory with a synthetic GlobalTerrorismDataset.zip of `scale` times the real
+    size (generated once and reused) and links to the GDP sources and rule sets."""
+    directory = os.path.abspath(os.path.join(BENCHMARK_DIR, f'scale-{scale:g}'))
+    os.makedirs(directory, exist_ok=True)
+    dataset_zip = os.path.join(directory, DATASET_ZIP)
+    if not os.path.exists(dataset_zip):
+        print(f"Generating synthetic dataset at {scale:g}x ...")
+        rows = write_synthetic_dataset(dataset_zip + '.tmp', scale, seed)
+        os.replace(dataset_zip + '.tmp', dataset_zip)
+        print(f"Wrote {rows} rows to {dataset_zip}")
+
+    for name in INPUT_FILES:
+        link = os.path.join(directory, name)
+        if not os.path.lexists(link):
+            os.symlink(os.path.abspath(name), link)
+    return directory
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark_pipeline_stages(scale=1.0, targets=None, output=BENCHMARK_RESULTS, trace_memory=False):
+    """Time and memory-profile every pipeline stage on a cold run over synthetic data.
+
+    Stages run in order in this process without the stage cache, from a clean
+    working directory (no Parquet cache or generated CSVs). The run is appended
+    to the JSON results file, and each stage is compared with the previous run
+    at the same scale. Stages are measured by a `StageRecorder`; `trace_memory`
+    adds per-stage allocation peaks from tracemalloc, which slows string-heavy
+    stages down several times, so use it for memory runs only.
+    """
+    output = os.path.abspath(output)
+    directory = prepare_benchmark_dir(scale)
+    pipeline = build_pipeline()
+    recorder = StageRecorder('table', trace_memory=trace_memory)
+
+    previous_directory = os.getcwd()
+    os.chdir(directory)
+    try:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        for generated in [path for stage in pipeline.stages.values() for path in stage.artifacts]:
+            if os.path.exists(generated):
+                os.remove(generated)
+
+        values, stages = {}, {}
+        for name in pipeline.required_stages(targets):
+            stage = pipeline.stages[name]
+            inputs = {input_name: values[input_name] for input_name in stage.inputs}
+            with contextlib.redirect_stdout(io.StringIO()):
+                result, record = recorder.run(name, stage.func, inputs, stage.params, len(stage.outputs))
+                # Background artifact writes are waited for and counted in the stage that queued them
+                start = time.perf_counter()
+                artifacts.store.wait()
+                record['wall_seconds'] = round(record['wall_seconds'] + time.perf_counter() - start, 4)
+            stages[name] = {key: value for key, value in record.items() if key not in ('stage', 'pid')}
+            if len(stage.outputs) == 1:
+                result = (result,)
+            values.update(zip(stage.outputs, result if stage.outputs else ()))
+    finally:
+        os.chdir(previous_directory)
+
+    run = {
+        'commit': _git_commit(), 'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'scale': scale, 'rows': len(values['df']) if 'df' in values else None, 'trace_memory': trace_memory,
+        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+        'total_seconds': round(sum(stage['wall_seconds'] for stage in stages.values()), 4), 'stages': stages,
+    }
+
+    history = []
+    if os.path.exists(output):
+        with open(output) as file:
+            history = json.load(file)
+    previous = next((past for past in reversed(history)
+                     if past['scale'] == scale and past.get('trace_memory') == trace_memory), None)
+    history.append(run)
+    with open(output, 'w') as file:
+        json.dump(history, file, indent=2)
+
+    print(f"\nPipeline stages at {scale:g}x ({run['rows']} rows), commit {run['commit']}:")
+    for name, stage in stages.items():
+        line = f"  {name:<12} {stage['wall_seconds']:>9.3f}s  cpu {stage['cpu_seconds']:>9.3f}s  peak rss {stage['peak_rss_mb']:>8.1f} MB"
+        if 'tracemalloc_peak_mb' in stage:
+            line += f"  traced {stage['tracemalloc_peak_mb']:>8.1f} MB"
+        if previous and name in previous['stages']:
+            line += f"  ({stage['wall_seconds'] / max(previous['stages'][name]['wall_seconds'], 1e-9):.2f}x of {previous['commit']})"
+        print(line)
+    print(f"  {'total':<12} {run['total_seconds']:>9.3f}s\nResults appended to {output}")
+    return run
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks, or per-stage benchmarks on synthetic GTD data.')
+    parser.add_argument('--scale', type=float, nargs='+', metavar='SCALE',
+                        help='Benchmark the pipeline stages on synthetic data of these sizes (e.g. 1 10 100).')
+    parser.add_argument('--stages', nargs='*', help='Stages to benchmark (with their dependencies); all by default.')
+    parser.add_argument('--output', default=BENCHMARK_RESULTS, help='JSON file the runs are appended to.')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Also record per-stage allocation peaks with tracemalloc (slows stages down).')
+    args = parser.parse_args()
+
+    if args.scale:
+        for scale in args.scale:
+            benchmark_pipeline_stages(scale, args.stages or None, args.output, args.trace_memory)
+    else:
+        benchmark_aggregated_columns()
+        benchmark_stratified_sampling()
+        benchmark_statistical_outliers()
+        benchmark_rule_engine()
+        benchmark_aggregate_cube()
+        benchmark_anomaly_detectors()
@@ -0,0 +1,230 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import artifacts
+from utils import CACHE_DIR, read_dataset
+from features import build_feature_matrix
+from gdp_lookup import GDPLookup
+from incremental import CovariancePCA, GroupMoments, ValueCounts
+from preprocess_gdp_dataset import GDP_ARTIFACT, build_gdp_dataset
+from rules import load_rule_sets
+from sampling import StratifiedReservoirSampler
+from cube import CUBE_ARTIFACT, AggregateCube
+from preprocessing import (DATASET_ZIP, PREPROCESSED_ARTIFACT, PCA_ARTIFACT, ANOMALIES_ARTIFACT, FILTERED_ARTIFACT,
+                           selected_columns, anomaly_columns,
+                           pca_numeric_columns, pca_scale_columns, build_pipeline, quality_report, derive_columns,
+                           discretization_counts, combine_anomalies)
+
+CHUNKED_DIR = os.path.join(CACHE_DIR, 'chunked')
+CONTEXTUAL_PARQUET = os.path.join(CHUNKED_DIR, 'contextual.parquet')
+SAMPLE_PARQUET = os.path.join(CHUNKED_DIR, 'sample.parquet')
+
+Z_SCORE_COLUMNS = ['Number of Killed People', 'Duration']
+# Detectors that need all rows at once (neighbour searches, iterative tests)
+IN_MEMORY_STAGES = ['knn', 'grubbs', 'lof', 'dbscan']
+
+
+class _ParquetSpill:
+    """Rows kept for a later pass, appended to a Parquet file as one row group per chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        # Per-chunk categoricals would give each row group a different dictionary; store the labels instead
+        chunk = chunk.astype({col: chunk[col].cat.categories.dtype for col in chunk.columns
+                              if isinstance(chunk[col].dtype, pd.CategoricalDtype)}).rename_axis('row').reset_index()
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            table = table.cast(artifacts.stream_schema(table))
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def chunks(self, chunksize):
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas().set_index('row').rename_axis(None)
+
+
+def _add_counts(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0).astype(np.int64)
+
+def _labels(counts):
+    """Category labels as `_category_codes` would find them on the whole column."""
+    labels = counts.values()
+    if not pd.api.types.is_numeric_dtype(labels):
+        missing = counts.has_missing or '' in labels
+        labels = labels.drop('', errors='ignore')
+    else:
+        missing = counts.has_missing
+    return labels.astype('object').append(pd.Index(['Unknown'])) if missing else labels
+
+def scan_dataset(dataset_zip, chunksize, categorical_columns):
+    """First pass over a few columns: the countries for the GDP table, and the exact medians
+    and labels of the PCA features, which every chunk must share."""
+    counts = {col: ValueCounts() for col in dict.fromkeys(['country_txt', *pca_numeric_columns, *categorical_columns])}
+    for chunk in read_dataset(dataset_zip, columns=list(counts), chunksize=chunksize):
+        for col, column_counts in counts.items():
+            values = chunk[col]
+            if col in pca_numeric_columns:
+                # Negative values are sentinels that build_feature_matrix fills with the median
+                values = values.where(values >= 0)
+            column_counts.update(values)
+
+    countries = set(counts['country_txt'].values())
+    fill_values = {col: counts[col].median() for col in pca_numeric_columns}
+    categories = {col: _labels(counts[col]) for col in categorical_columns}
+    return countries, fill_values, categories
+
+def _z_score_anomalies(spill, moments, column, threshold, by, chunksize):
+    """Second pass over the spilled rows: rows whose z-score against the merged group moments exceeds `threshold`."""
+    valid_rows = 0
+    anomalies = []
+    for chunk in spill.chunks(chunksize):
+        valid = chunk[chunk[column] != -99].copy()
+        valid_rows += len(valid)
+        valid['Z Score'] = moments.z_scores(valid, column)
+        anomalies.append(valid[np.abs(valid['Z Score']) > threshold])
+    anomalies = pd.concat(anomalies) if anomalies else pd.DataFrame()
+
+    anomaly_percentage = (len(anomalies) / valid_rows) * 100 if valid_rows > 0 else 0
+    baseline = f" per {', '.join(by)}" if by else ""
+    print(f"\nStatistical-Based Anomalies using Z-Score for {column}{baseline}: {anomaly_percentage:.2f}%")
+    if not anomalies.empty:
+        top_5_anomalies = anomalies.assign(abs_score=anomalies['Z Score'].abs()).sort_values('abs_score', ascending=False).head(5)
+        print("\nTop 5 anomalies by highest absolute z-score:")
+        print(top_5_anomalies[['Year', 'Country', column, 'Z Score']])
+    else:
+        print("No anomalies found.")
+    return anomalies
+
+def run_chunked(dataset_zip=DATASET_ZIP, chunksize=100_000, params=None):
+    """Run the pipeline over chunks of `chunksize` rows, so peak memory depends on the chunk size
+    rather than on the size of the dataset.
+
+    The row-local stages (selection and renaming, Duration and Casualties,
+    -99 fills, GDP enrichment, contextual and cleaning rules) transform each
+    chunk and append it to their artifacts. The global stages are built from
+    mergeable aggregates: the aggregate cube, exact value counts for the
+    discretization and the PCA fill values, X^T X for the PCA and per-group count, mean and M2 for the
+    z-scores, followed by a second pass that projects and scores the rows.
+    The stratified sample keeps each row with probability `sampling_fraction`
+    (so stratum sizes match the in-memory sample only in expectation) and is
+    saved to SAMPLE_PARQUET. The quality report already streams. The detectors
+    in IN_MEMORY_STAGES need all rows at once and are skipped. `params`
+    overrides stage parameters as in `Pipeline.run`; overriding a skipped
+    stage is an error. The pipeline's cached stages that write the same
+    artifacts are invalidated, so a later pipeline run writes them again.
+    """
+    params = params or {}
+    skipped = [name for name in params if name in IN_MEMORY_STAGES]
+    if skipped:
+        raise ValueError(f"The chunked mode does not run {', '.join(skipped)}; drop their --param overrides.")
+    pipeline = build_pipeline()
+    stage_params = {name: {**stage.params, **params.get(name, {})} for name, stage in pipeline.stages.items()}
+    zscore_params, pca_params = stage_params['zscore'], stage_params['pca']
+    if zscore_params['robust']:
+        raise ValueError("Robust z-scores need exact group medians, which the chunked mode does not compute; "
+                         "use zscore.robust=False.")
+    by = list(zscore_params['by'])
+    categorical_columns = list(pca_params['categorical_columns'])
+
+    # The artifacts written below replace the pipeline's, so its stages that wrote them must run again
+    pipeline.invalidate([path for name in (GDP_ARTIFACT, PREPROCESSED_ARTIFACT, CUBE_ARTIFACT, PCA_ARTIFACT,
+                                           ANOMALIES_ARTIFACT, FILTERED_ARTIFACT)
+                         for path in artifacts.store.paths(name)])
+
+    quality_report(dataset_zip, chunksize)
+
+    countries, fill_values, categories = scan_dataset(dataset_zip, chunksize, categorical_columns)
+    gdp_df = build_gdp_dataset(countries)
+    artifacts.store.save(gdp_df, GDP_ARTIFACT)
+    gdp_lookup = GDPLookup.from_frame(gdp_df)
+    del gdp_df
+
+    contextual_rules = load_rule_sets(stage_params['contextual']['rules_file'])['contextual']
+    cleaning_rules = load_rule_sets(stage_params['clean']['rules_file'])['cleaning']
+    moments = {column: GroupMoments(by) for column in Z_SCORE_COLUMNS}
+    pca = CovariancePCA(pca_params['n_components'], scale=[pca_numeric_columns.index(col) for col in pca_scale_columns])
+    preprocessed, filtered = artifacts.store.writer(PREPROCESSED_ARTIFACT), artifacts.store.writer(FILTERED_ARTIFACT)
+    spill = _ParquetSpill(CONTEXTUAL_PARQUET)
+    sampler = StratifiedReservoirSampler(['Decade', 'Region'], frac=stage_params['sample']['sampling_fraction'],
+                                         random_state=1)
+    victim_distribution = decade_distribution = contextual_hits = cleaning_hits = cube = None
+
+    print(f'\n\nSelected Columns:\n{selected_columns}\n')
+    columns = list(dict.fromkeys(selected_columns + pca_numeric_columns + categorical_columns))
+    n_chunks = 0
+    for chunk in read_dataset(dataset_zip, columns=columns, chunksize=chunksize):
+        n_chunks += 1
+        victims, decades = discretization_counts(chunk)
+        victim_distribution = _add_counts(victim_distribution, victims)
+        decade_distribution = _add_counts(decade_distribution, decades)
+        features, _ = build_feature_matrix(chunk, pca_numeric_columns, categorical_columns, drop_first=True,
+                                           fill_values=fill_values, categories=categories)
+        pca.partial_fit(features)
+
+        filtered_df = derive_columns(chunk)
+        filtered_df['Decade'] = (filtered_df['Year'] // 10) * 10
+        sampler.update(filtered_df)
+        preprocessed.write(gdp_lookup.attach(filtered_df).drop(columns=['Country']))
+        chunk_cube = AggregateCube.from_events(filtered_df)
+        cube = chunk_cube if cube is None else cube.merge(chunk_cube)
+
+        contextual_df, hits = contextual_rules.apply(filtered_df)
+        contextual_hits = _add_counts(contextual_hits, hits)
+        for column, column_moments in moments.items():
+            column_moments.update(contextual_df[contextual_df[column] != -99], column)
+        spill.write(contextual_df[list(dict.fromkeys(by + [col for col in anomaly_columns if col in contextual_df]))])
+
+        cleaned_df, hits = cleaning_rules.apply(contextual_df)
+        cleaning_hits = _add_counts(cleaning_hits, hits)
+        filtered.write(cleaned_df)
+    spill.close()
+
+    print(f"Processed {preprocessed.rows} rows in {n_chunks} chunks of up to {chunksize} rows.")
+    print(f'Data saved to {", ".join(preprocessed.close())} with selected columns, new names, and GDP information.')
+    paths = cube.save()
+    print(f"Aggregate cube of {preprocessed.rows} events in {len(cube.cells)} cells saved to {', '.join(paths)}")
+    print(f'\nBinning:\n{victim_distribution.sort_values(ascending=False, kind="stable")}')
+    print(f'\nDecade Distribution:\n{decade_distribution.sort_values(ascending=False, kind="stable")}')
+    sampled_df = sampler.sample()
+    sampled_df.to_parquet(SAMPLE_PARQUET, index=False)
+    print(f"Stratified sample of {len(sampled_df)} rows by Decade and Region saved to {SAMPLE_PARQUET}")
+    del sampled_df
+
+    pca.fit()
+    print(pca.explained_variance_ratio_)
+    reduced = artifacts.store.writer(PCA_ARTIFACT)
+    for chunk in read_dataset(dataset_zip, columns=pca_numeric_columns + categorical_columns, chunksize=chunksize):
+        features, _ = build_feature_matrix(chunk, pca_numeric_columns, categorical_columns, drop_first=True,
+                                           fill_values=fill_values, categories=categories)
+        reduced.write(pd.DataFrame(pca.transform(features), columns=[f'PC{i + 1}' for i in range(pca.n_components)]))
+    reduced.close()
+
+    print(f"\n\n-------------------------------------------------------------------------------\n")
+    print(f"Detecting Anomalies \n\n")
+    print(f"Detecting and handling Contextual Anomalies")
+    for description, removed_count in contextual_rules.describe(contextual_hits).items():
+        print(f"\n{removed_count} rows removed {description}.\n\n")
+
+    stat_anomalies = [_z_score_anomalies(spill, moments[column], column, zscore_params['threshold'], by, chunksize)
+                      for column in Z_SCORE_COLUMNS]
+    print(f"\nSkipped in chunked mode (they need all rows in memory): {', '.join(IN_MEMORY_STAGES)}")
+    combine_anomalies(*stat_anomalies, pd.DataFrame(), pd.DataFrame())
+
+    for description, removed_count in cleaning_rules.describe(cleaning_hits).items():
+        print(f"{removed_count} rows removed {description}.")
+    print(f"Filtered dataset saved to {', '.join(filtered.close())}")
+    artifacts.store.wait()
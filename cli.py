@@ -0,0 +1,129 @@
+import argparse
+import inspect
+import os
+import sys
+import time
+
+# Pipeline stages run by each command (with the stages they depend on)
+COMMANDS = {
+    'quality': ['quality'],
+    'gdp': ['gdp'],
+    'preprocess': ['select', 'cube', 'sample', 'gdp_merge', 'discretize'],
+    'pca': ['pca'],
+    'clean': ['clean'],
+}
+ANOMALY_METHODS = {
+    'knn': ['knn'],
+    'zscore': ['zscore'],
+    'grubbs': ['grubbs'],
+    'lof': ['lof'],
+    'dbscan': ['dbscan'],
+    'all': ['knn', 'zscore', 'grubbs', 'lof', 'dbscan', 'anomalies'],
+}
+
+
+def build_parser():
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--param', action='append', default=[], metavar='STAGE.NAME=VALUE',
+                         help='Override a stage parameter, e.g. dbscan.eps=0.5')
+    options.add_argument('--force', action='append', default=[], metavar='STAGE',
+                         help='Rerun a stage even if its cached output is still valid.')
+    options.add_argument('--jobs', type=int, default=os.cpu_count(),
+                         help='Worker processes for the independent anomaly detectors (1 runs them sequentially).')
+    options.add_argument('--instrument', choices=['table', 'jsonl'],
+                         help='Record time, memory and row counts per stage (or set GTD_INSTRUMENT).')
+    options.add_argument('--instrument-file', help='Append the JSON lines to this file instead of stderr.')
+    options.add_argument('--trace-memory', action='store_true', help='Add tracemalloc peaks to the stage records.')
+    options.add_argument('--profile', metavar='STAGE', help='Run one stage under a profiler (profile saved to .cache/profiles).')
+    options.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], help='Profiler for --profile (cProfile by default).')
+    options.add_argument('--export-csv', action='store_true',
+                         help='Also write every artifact as CSV next to its Parquet file (or set GTD_EXPORT_CSV).')
+
+    parser = argparse.ArgumentParser(description='Run the Global Terrorism Dataset preprocessing pipeline.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('quality', parents=[options], help='Data quality report of the raw dataset.')
+    commands.add_parser('gdp', parents=[options], help='Build the GDP table of the countries in the dataset.')
+    commands.add_parser('preprocess', parents=[options],
+                        help='Select and derive the columns, merge the GDP, build the cube, sample and discretize.')
+    commands.add_parser('pca', parents=[options], help='Principal component analysis of the numeric and categorical features.')
+    anomalies = commands.add_parser('anomalies', parents=[options], help='Run anomaly detectors.')
+    anomalies.add_argument('--method', action='append', choices=list(ANOMALY_METHODS),
+                           help="Detector to run (repeatable); 'all' runs every detector and saves the combined anomalies.")
+    commands.add_parser('clean', parents=[options], help='Remove the contextual anomalies and invalid rows and save the dataset.')
+    run = commands.add_parser('run', parents=[options], help='Run the given stages, or the whole pipeline.')
+    run.add_argument('stages', nargs='*', help='Stages to run (with their dependencies); all by default.')
+    run.add_argument('--chunked', action='store_true',
+                     help='Stream the dataset in chunks so memory is bounded by --chunksize (skips the in-memory detectors; '
+                          'stages, --force, --instrument and --profile do not apply).')
+    run.add_argument('--chunksize', type=int, default=100_000, help='Rows per chunk in --chunked mode.')
+    return parser
+
+def command_stages(args):
+    if args.command == 'run':
+        return args.stages or None
+    if args.command == 'anomalies':
+        return list(dict.fromkeys(stage for method in args.method or ['all'] for stage in ANOMALY_METHODS[method]))
+    return COMMANDS[args.command]
+
+def check_arguments(parser, args, pipeline, params):
+    """Report unknown stages and parameters as usage errors, before any stage runs."""
+    stages = pipeline.stages
+    names = list(getattr(args, 'stages', None) or []) + args.force + ([args.profile] if args.profile else [])
+    unknown = [name for name in names if name not in stages]
+    if unknown:
+        parser.error(f"unknown stage {', '.join(unknown)} (available stages: {', '.join(stages)})")
+    for stage_name, stage_params in params.items():
+        if stage_name not in stages:
+            parser.error(f"--param for unknown stage {stage_name} (available stages: {', '.join(stages)})")
+        stage = stages[stage_name]
+        accepted = [name for name in inspect.signature(stage.func).parameters if name not in stage.inputs]
+        unknown = [name for name in stage_params if name not in accepted]
+        if unknown:
+            parser.error(f"unknown parameter {', '.join(unknown)} of stage {stage_name} "
+                         f"(it takes {', '.join(accepted) or 'no parameters'})")
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'chunked', False):
+        # The chunked mode runs its own passes instead of the pipeline's stages
+        ignored = [option for option, value in [('stages', args.stages), ('--force', args.force),
+                                                ('--instrument', args.instrument), ('--instrument-file', args.instrument_file),
+                                                ('--trace-memory', args.trace_memory), ('--profile', args.profile),
+                                                ('--profiler', args.profiler)] if value]
+        if ignored:
+            parser.error(f"--chunked does not support {', '.join(ignored)}")
+
+    # The pipeline modules import pandas; scikit-learn and scipy are only imported by the stages that use them
+    start = time.perf_counter()
+    import pandas as pd
+    import artifacts
+    from instrumentation import StageRecorder
+    from preprocessing import DATASET_ZIP, build_pipeline, parse_params
+    print(f"[cli] imports: {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    pd.set_option('display.max_rows', None)
+    pd.set_option('display.max_columns', None)
+
+    artifacts.configure(args.export_csv)
+    try:
+        params = parse_params(args.param)
+    except ValueError as error:
+        parser.error(str(error))
+    pipeline = build_pipeline()
+    check_arguments(parser, args, pipeline, params)
+
+    if getattr(args, 'chunked', False):
+        from chunked import IN_MEMORY_STAGES, run_chunked
+
+        skipped = [name for name in params if name in IN_MEMORY_STAGES]
+        if skipped:
+            parser.error(f"--chunked does not run {', '.join(skipped)}; drop their --param overrides")
+        run_chunked(DATASET_ZIP, args.chunksize, params)
+    else:
+        recorder = StageRecorder.from_env(args.instrument, args.instrument_file, args.trace_memory, args.profile, args.profiler)
+        pipeline.run(command_stages(args), params, args.force, args.jobs, recorder, artifacts.store)
+
+
+if __name__ == '__main__':
+    main()
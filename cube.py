@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+import artifacts
+
+CUBE_ARTIFACT = 'Aggregate_Cube'
+CUBE_PARQUET = f'{CUBE_ARTIFACT}.parquet'
+
+CUBE_DIMENSIONS = ['Year', 'Country', 'Region', 'Attack Type', 'Weapon Type', 'Target Type']
+# Summed columns of the events; -99 and other negative sentinels are left out of the sums
+SUMMED_COLUMNS = {'Success': 'Success', 'Suicide': 'Suicide', 'Killed': 'Number of Killed People',
+                  'Wounded': 'Number of Wounded People', 'Casualties': 'Number of Casualties'}
+SENTINEL_MEASURES = ['Killed', 'Wounded', 'Casualties']
+# Dimensions computed from a stored one when a query asks for them
+DERIVED_DIMENSIONS = {'Decade': lambda cells: (cells['Year'] // 10) * 10}
+
+
+class AggregateCube:
+    """Event counts and sums per (Year, Country, Region, Attack Type, Weapon Type, Target Type).
+
+    Every cell holds the number of attacks, the Success and Suicide sums and
+    the killed, wounded and casualty sums with the count of events that report
+    them (the -99 sentinels count in neither). Queries roll the cells up to the
+    requested dimensions instead of scanning the events, and since sums and
+    counts add up, cubes of chunks merge into the cube of the whole dataset.
+    """
+
+    def __init__(self, cells):
+        self.cells = cells.reset_index(drop=True)
+        self._codes = {}
+        self._values = self._dtypes = None
+
+    @classmethod
+    def from_events(cls, events):
+        measures = {'Attacks': np.ones(len(events), dtype=np.int64)}
+        for measure, column in SUMMED_COLUMNS.items():
+            values = events[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            if measure in SENTINEL_MEASURES:
+                reported = values >= 0
+                measures[measure] = np.where(reported, values, 0)
+                measures[f'{measure} Reported'] = reported.astype(np.int64)
+            else:
+                measures[measure] = np.nan_to_num(values).astype(np.int64)
+        measures = pd.DataFrame(measures, index=events.index)
+        cells = measures.groupby([events[dim] for dim in CUBE_DIMENSIONS], observed=True, dropna=False).sum()
+        return cls(cells.reset_index())
+
+    def merge(self, other):
+        """Cube of the events of both cubes."""
+        cells = pd.concat([self.cells, other.cells], ignore_index=True)
+        for dim in CUBE_DIMENSIONS:
+            if not pd.api.types.is_numeric_dtype(cells[dim]):
+                cells[dim] = cells[dim].astype('category')
+        return AggregateCube(cells.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).sum().reset_index())
+
+    @classmethod
+    def read(cls, path=CUBE_PARQUET):
+        return cls(pd.read_parquet(path))
+
+    def save(self, name=CUBE_ARTIFACT):
+        """Queue the cells to be written by the artifact store; returns the paths."""
+        return artifacts.store.save(self.cells, name)
+
+    @property
+    def measures(self):
+        return [col for col in self.cells.columns if col not in CUBE_DIMENSIONS]
+
+    def _dimension(self, name):
+        if name in self.cells:
+            return self.cells[name]
+        if name in DERIVED_DIMENSIONS:
+            return DERIVED_DIMENSIONS[name](self.cells)
+        raise KeyError(f"Unknown dimension '{name}'. Available dimensions: {CUBE_DIMENSIONS + list(DERIVED_DIMENSIONS)}")
+
+    def _dimension_codes(self, name):
+        """Sorted labels of a dimension and the label code of every cell (missing values get the last code)."""
+        if name not in self._codes:
+            codes, labels = pd.factorize(self._dimension(name), sort=True)
+            missing = codes < 0
+            if missing.any():
+                codes[missing] = len(labels)
+                labels = labels.append(pd.Index([np.nan]))
+            self._codes[name] = codes, labels
+        return self._codes[name]
+
+    def _mask(self, where):
+        mask = np.ones(len(self.cells), dtype=bool)
+        for name, values in where.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            codes, labels = self._dimension_codes(name.replace('_', ' '))
+            mask &= np.isin(codes, np.flatnonzero(labels.isin(values)))
+        return mask
+
+    def slice(self, **where):
+        """Cube of the cells matching every condition: a value or a list of values per dimension,
+        e.g. `slice(Region='South Asia', Decade=[1990, 2000])`. Underscores stand for spaces."""
+        return AggregateCube(self.cells[self._mask(where)])
+
+    def query(self, by=(), measures=None, **where):
+        """Measures summed over every dimension not in `by`, within the `slice` given by `where`.
+
+        The result has one row per combination of `by` present in the cube (a
+        single row of totals when empty), sorted like a groupby. `Killed Mean`
+        style columns are added for the sentinel measures (over the events that
+        report them) and `Success Rate` / `Suicide Rate` per attack. The cells
+        are grouped with one `np.bincount` per measure on dimension codes that
+        are computed once per cube, so repeated queries do not rescan labels.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        measures = list(measures) if measures is not None else self.measures
+        needed = list(dict.fromkeys(measures + ['Attacks'] + [f'{m} Reported' for m in SENTINEL_MEASURES if m in measures]))
+        if self._values is None:
+            self._values = {col: self.cells[col].to_numpy(dtype=np.float64) for col in self.measures}
+            self._dtypes = {col: np.int64 if pd.api.types.is_integer_dtype(self.cells[col]) else np.float64
+                            for col in self.measures}
+
+        rows = np.flatnonzero(self._mask(where)) if where else slice(None)
+        encoded = [self._dimension_codes(name) for name in by]
+        shape = tuple(len(labels) for _, labels in encoded)
+        flat = np.ravel_multi_index([codes[rows] for codes, _ in encoded], shape) if by else np.zeros(len(self.cells), dtype=np.int64)[rows]
+        size = int(np.prod(shape)) if by else 1
+        if size > 4 * len(self.cells):
+            # Sparse combinations: number the observed ones instead of allocating every slot
+            observed, flat = np.unique(flat, return_inverse=True)
+            size = len(observed)
+        else:
+            observed = None
+
+        sums = {col: np.bincount(flat, self._values[col][rows], minlength=size) for col in needed}
+        present = sums['Attacks'] > 0 if by else np.ones(1, dtype=bool)
+        columns = {col: values[present].astype(self._dtypes[col]) for col, values in sums.items()}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for measure in measures:
+                if measure in SENTINEL_MEASURES:
+                    columns[f'{measure} Mean'] = columns[measure] / columns[f'{measure} Reported']
+                elif measure in ('Success', 'Suicide'):
+                    columns[f'{measure} Rate'] = columns[measure] / columns['Attacks']
+
+        index = None
+        if by:
+            slots = np.flatnonzero(present) if observed is None else observed[present]
+            level_codes = np.unravel_index(slots, shape)
+            levels = [labels for _, labels in encoded]
+            index = pd.MultiIndex(levels=[labels.dropna() for labels in levels], names=by,
+                                  codes=[np.where(labels[codes].isna(), -1, codes) for codes, labels in zip(level_codes, levels)])
+            if len(by) == 1:
+                index = index.get_level_values(0)
+        return pd.DataFrame(columns, index=index)
+
+    def crosstab(self, rows, columns, measure='Attacks', **where):
+        """`rows` x `columns` table of a measure, like pd.crosstab on the events: zeros for empty
+        pairs and no row or column for missing labels."""
+        table = self.query([rows, columns], [measure], **where)[measure].unstack(fill_value=0)
+        table.columns.name = columns
+        return table.loc[table.index.notna(), table.columns.notna()]
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes with 2**precision one-byte registers."""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # The guard bit keeps the remaining bits non-zero; frexp's exponent is then the
+        # exact bit length, since values below 2**53 convert to float64 without rounding.
+        remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        _, exponent = np.frexp((remaining >> np.uint64(11)).astype(np.float64))
+        rank = (64 - (exponent + 11) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class DataQualityProfiler:
+    """Completeness, distinct counts and duplicate rows from a single pass over chunks.
+
+    Distinct values are counted exactly on 64-bit value hashes until a column has
+    more than `exact_limit` of them, after which it switches to a HyperLogLog
+    sketch, so memory per column is bounded. Duplicate rows are counted from
+    64-bit row hashes (8 bytes per row instead of the rows themselves).
+    """
+
+    def __init__(self, exact_limit=50_000, precision=16):
+        self.exact_limit = exact_limit
+        self.precision = precision
+        self.columns = None
+        self.rows = 0
+        self.missing = None
+        self.exact = {}
+        self.sketches = {}
+        self.row_hashes = []
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.missing = pd.Series(0, index=self.columns, dtype=np.int64)
+            self.exact = {col: np.empty(0, dtype=np.uint64) for col in self.columns}
+
+        self.rows += len(chunk)
+        self.missing += chunk.isnull().sum()
+        self.row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+
+        for col in self.columns:
+            values = chunk[col].dropna()
+            hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+            if col in self.sketches:
+                self.sketches[col].add_hashes(hashes)
+                continue
+            self.exact[col] = np.union1d(self.exact[col], hashes)
+            if len(self.exact[col]) > self.exact_limit:
+                self.sketches[col] = HyperLogLog(self.precision)
+                self.sketches[col].add_hashes(self.exact.pop(col))
+        return self
+
+    def completeness(self):
+        return pd.DataFrame({
+            'Missing Values Count': self.missing,
+            'Completeness Percentage': (1 - (self.missing / self.rows)) * 100
+        })
+
+    def uniqueness(self):
+        unique_counts = pd.Series({
+            col: self.sketches[col].count() if col in self.sketches else len(self.exact[col])
+            for col in self.columns
+        }, dtype=np.int64)
+        return pd.DataFrame({'Unique Values Count': unique_counts})
+
+    def duplicate_count(self):
+        if not self.row_hashes:
+            return 0
+        self.row_hashes = [np.concatenate(self.row_hashes)]
+        return int(len(self.row_hashes[0]) - len(np.unique(self.row_hashes[0])))
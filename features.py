@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _category_codes(series, categories=None):
+    """Integer codes and category labels of a column, with missing or empty values as 'Unknown'.
+
+    With `categories` the labels are fixed (e.g. collected over all chunks) and
+    values outside them are coded as 'Unknown' when it is one of the labels.
+    """
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.mask(series.astype('object') == '')
+    if categories is not None:
+        categories = pd.Index(categories)
+        codes = categories.get_indexer(series)
+        if 'Unknown' in categories:
+            codes[codes < 0] = categories.get_loc('Unknown')
+        return codes, categories
+    codes, categories = pd.factorize(series, sort=True)
+    if (codes < 0).any():
+        codes[codes < 0] = len(categories)
+        categories = categories.astype('object').append(pd.Index(['Unknown']))
+    return codes, categories
+
+def build_feature_matrix(data, numeric_columns=(), categorical_columns=(), scale_columns=(),
+                         drop_first=False, deduplicate=False, fill_values=None, categories=None):
+    """Sparse feature matrix: numeric columns followed by a one-hot block per categorical column.
+
+    Negative numeric values (the -99 style sentinels) are masked to NaN and filled
+    with the column median, and `scale_columns` are standardized, all with NumPy
+    on whole columns. Categorical columns are one-hot encoded straight into CSR
+    from their integer codes. With `deduplicate` the rows are collapsed to the
+    unique rows before the one-hot expansion, and the inverse index and counts
+    are returned as well, so duplicate-aware detectors can reuse the builder.
+    `fill_values` and `categories` (dicts by column) replace the medians and
+    labels computed from `data`, so chunks of a larger dataset get the same columns.
+    """
+    numeric_columns = list(numeric_columns)
+    categorical_columns = list(categorical_columns)
+
+    numeric = data[numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    numeric[numeric < 0] = np.nan
+    if fill_values is not None:
+        medians = np.array([fill_values[col] for col in numeric_columns], dtype=np.float64)
+    else:
+        medians = np.nanmedian(numeric, axis=0) if len(numeric) else np.zeros(len(numeric_columns))
+    missing = np.isnan(numeric)
+    numeric[missing] = np.take(medians, np.nonzero(missing)[1])
+
+    for col in scale_columns:
+        values = numeric[:, numeric_columns.index(col)]
+        std = values.std()
+        values -= values.mean()
+        if std > 0:
+            values /= std
+
+    encoded = [_category_codes(data[col], None if categories is None else categories[col])
+               for col in categorical_columns]
+    codes = np.column_stack([col_codes for col_codes, _ in encoded]) if encoded else np.empty((len(data), 0), dtype=np.int64)
+
+    inverse = counts = None
+    if deduplicate:
+        stacked = np.column_stack([numeric, codes])
+        unique, inverse, counts = np.unique(stacked, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        numeric, codes = unique[:, :len(numeric_columns)], unique[:, len(numeric_columns):].astype(np.int64)
+
+    n_rows = len(numeric)
+    blocks = [sp.csr_matrix(numeric)]
+    feature_names = list(numeric_columns)
+    for position, (col, (_, categories)) in enumerate(zip(categorical_columns, encoded)):
+        first = 1 if drop_first else 0
+        col_codes = codes[:, position] - first
+        keep = col_codes >= 0
+        one_hot = sp.csr_matrix(
+            (np.ones(keep.sum()), (np.flatnonzero(keep), col_codes[keep])),
+            shape=(n_rows, len(categories) - first)
+        )
+        blocks.append(one_hot)
+        feature_names.extend(f'{col}_{category}' for category in categories[first:])
+
+    matrix = sp.hstack(blocks, format='csr')
+    if deduplicate:
+        return matrix, feature_names, inverse, counts
+    return matrix, feature_names
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+FIRST_YEAR = 1970
+LAST_YEAR = 2017
+
+
+class GDPLookup:
+    """Dense Country x Year GDP matrix for 1970-2017 with a country-code index.
+
+    GDP is attached to events by integer fancy-indexing into the matrix instead
+    of a string-keyed merge. Missing countries or years give NaN, like a left merge.
+    """
+
+    def __init__(self, countries, matrix):
+        self.countries = pd.Index(countries)
+        self.matrix = matrix
+
+    @classmethod
+    def from_frame(cls, gdp_df):
+        gdp_df = gdp_df.dropna(subset=['Year'])
+        gdp_df = gdp_df[gdp_df['Year'].between(FIRST_YEAR, LAST_YEAR)]
+        gdp_df = gdp_df.drop_duplicates(subset=['Country', 'Year'])
+
+        countries = pd.Index(gdp_df['Country'].unique())
+        matrix = np.full((len(countries), LAST_YEAR - FIRST_YEAR + 1), np.nan)
+        codes = countries.get_indexer(gdp_df['Country'])
+        years = gdp_df['Year'].to_numpy(dtype=np.int64) - FIRST_YEAR
+        matrix[codes, years] = gdp_df['GDP'].to_numpy(dtype=np.float64)
+        return cls(countries, matrix)
+
+    @classmethod
+    def from_csv(cls, file_path):
+        return cls.from_frame(pd.read_csv(file_path))
+
+    def country_codes(self, countries):
+        """Row index of each country in the matrix, -1 when unknown."""
+        if isinstance(countries.dtype, pd.CategoricalDtype):
+            category_codes = self.countries.get_indexer(countries.cat.categories)
+            codes = countries.cat.codes.to_numpy()
+            return np.where(codes >= 0, category_codes[codes], -1)
+        return self.countries.get_indexer(countries)
+
+    def lookup(self, countries, years):
+        codes = self.country_codes(pd.Series(countries))
+        offsets = np.asarray(years, dtype=np.int64) - FIRST_YEAR
+        valid = (codes >= 0) & (offsets >= 0) & (offsets < self.matrix.shape[1])
+
+        gdp = np.full(len(codes), np.nan)
+        gdp[valid] = self.matrix[codes[valid], offsets[valid]]
+        return gdp
+
+    def attach(self, data, country_column='Country', year_column='Year', name='GDP'):
+        """Copy of `data` with a GDP column, equivalent to a left merge on Year and Country."""
+        data = data.copy()
+        data[name] = self.lookup(data[country_column], data[year_column].to_numpy())
+        return data
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from sklearn.utils.extmath import svd_flip
+
+
+class ValueCounts:
+    """Exact counts of the distinct values of a column, merged across chunks.
+
+    Count columns such as nkill or nperps only take a few hundred distinct
+    values, so the counts stay small however many rows are added, and give the
+    exact median and category set of the whole column.
+    """
+
+    def __init__(self):
+        self.counts = pd.Series(dtype=np.int64)
+        self.has_missing = False
+
+    def update(self, values):
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        self.has_missing |= bool(values.isna().any())
+        self.counts = self.counts.add(values.value_counts(), fill_value=0).astype(np.int64)
+
+    def values(self):
+        return self.counts.index.sort_values()
+
+    def median(self):
+        """Median like np.nanmedian: the mean of the two middle values for an even count; NaN when empty."""
+        counts = self.counts.sort_index()
+        total = counts.sum()
+        if not total:
+            return np.nan
+        ends = np.cumsum(counts.to_numpy())
+        values = counts.index.to_numpy(dtype=np.float64)
+        lower = values[np.searchsorted(ends, (total - 1) // 2, side='right')]
+        upper = values[np.searchsorted(ends, total // 2, side='right')]
+        return (lower + upper) / 2
+
+
+class GroupMoments:
+    """Count, mean and sum of squared deviations (M2) of a column per group, merged across chunks.
+
+    Chunks are combined with Chan et al.'s pairwise update, which is as accurate
+    as a two-pass computation, so the group means and standard deviations equal
+    those of the full column without holding it. An empty `by` is a single
+    group of all rows, as in `statistical_outliers.group_codes`.
+    """
+
+    def __init__(self, by):
+        self.by = list(by)
+        levels = self.by or ['All']
+        self.stats = pd.DataFrame({'count': [], 'mean': [], 'm2': []},
+                                  index=pd.MultiIndex.from_arrays([[]] * len(levels), names=levels))
+
+    def _keys(self, data):
+        """Group key columns of `data`; one constant 'All' column when `by` is empty."""
+        return data[self.by] if self.by else pd.DataFrame({'All': np.zeros(len(data), dtype=np.int8)}, index=data.index)
+
+    def update(self, data, column):
+        keys = self._keys(data)
+        grouped = data[column].groupby([keys[col] for col in keys.columns], observed=True, sort=False)
+        count = grouped.count()
+        chunk = pd.DataFrame({'count': count, 'mean': grouped.mean(), 'm2': grouped.var(ddof=0) * count})
+        chunk.index = pd.MultiIndex.from_frame(chunk.index.to_frame(index=False))
+        self.merge(chunk[chunk['count'] > 0])
+
+    def merge(self, other):
+        stats = other if isinstance(other, pd.DataFrame) else other.stats
+        left, right = self.stats.align(stats, join='outer', fill_value=0)
+        count = left['count'] + right['count']
+        delta = right['mean'] - left['mean']
+        self.stats = pd.DataFrame({
+            'count': count,
+            'mean': left['mean'] + delta * right['count'] / count,
+            'm2': left['m2'] + right['m2'] + delta ** 2 * left['count'] * right['count'] / count,
+        })
+
+    def z_scores(self, data, column):
+        """Z-score (ddof=1) of every row of `data` against its group; NaN for groups of one row or unknown groups."""
+        stats = self.stats.assign(std=np.sqrt(self.stats['m2'] / (self.stats['count'] - 1)).where(self.stats['count'] > 1))
+        keys = self._keys(data)
+        rows = keys.merge(stats[['mean', 'std']].reset_index(), on=list(keys.columns), how='left')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (data[column].to_numpy(dtype=np.float64) - rows['mean'].to_numpy()) / rows['std'].to_numpy()
+
+
+class CovariancePCA:
+    """PCA fitted from X^T X, the column sums and the row count, accumulated over chunks.
+
+    These sums are all `PCA(svd_solver='covariance_eigh')` uses, so the
+    components and explained variance match a fit on the whole matrix while
+    memory only depends on the number of features. The columns at the `scale`
+    positions are standardized (population standard deviation, as StandardScaler)
+    before the decomposition; since that is an affine map, the covariance of the
+    standardized columns follows from the same sums.
+    """
+
+    def __init__(self, n_components=2, scale=()):
+        self.n_components = n_components
+        self.scale = scale
+        self.n_samples = 0
+        self.sums = None
+        self.gram = None
+
+    def partial_fit(self, features):
+        gram = features.T @ features
+        gram = gram.toarray() if hasattr(gram, 'toarray') else np.asarray(gram)
+        sums = np.asarray(features.sum(axis=0)).reshape(-1)
+        if self.gram is None:
+            self.sums, self.gram = np.zeros_like(sums, dtype=np.float64), np.zeros_like(gram, dtype=np.float64)
+        self.n_samples += features.shape[0]
+        self.sums += sums
+        self.gram += gram
+        return self
+
+    def fit(self):
+        """Decompose the accumulated covariance; call after the last `partial_fit`."""
+        n = self.n_samples
+        mean = self.sums / n
+        covariance = (self.gram - n * np.outer(mean, mean)) / (n - 1)
+
+        scale = np.zeros(len(mean), dtype=bool)
+        scale[list(self.scale)] = True
+        std = np.sqrt(np.clip(np.diag(covariance) * (n - 1) / n, 0, None))
+        self.multiplier_ = np.where(scale & (std > 0), 1 / np.where(std > 0, std, 1), 1.0)
+        self.offset_ = np.where(scale, -mean * self.multiplier_, 0.0)
+        covariance *= np.outer(self.multiplier_, self.multiplier_)
+        self.mean_ = mean * self.multiplier_ + self.offset_
+
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        eigenvalues, eigenvectors = eigenvalues[::-1], eigenvectors[:, ::-1]
+        eigenvalues[eigenvalues < 0] = 0
+        _, components = svd_flip(None, eigenvectors.T, u_based_decision=False)
+
+        self.components_ = components[:self.n_components]
+        self.explained_variance_ = eigenvalues[:self.n_components]
+        self.explained_variance_ratio_ = self.explained_variance_ / eigenvalues.sum()
+        return self
+
+    def transform(self, features):
+        features = features.toarray() if hasattr(features, 'toarray') else np.asarray(features, dtype=np.float64)
+        return (features * self.multiplier_ + self.offset_ - self.mean_) @ self.components_.T
@@ -0,0 +1,187 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from utils import CACHE_DIR
+
+# Environment switches, equivalent to the --instrument, --instrument-file, --trace-memory and --profile flags
+INSTRUMENT_ENV = 'GTD_INSTRUMENT'
+INSTRUMENT_FILE_ENV = 'GTD_INSTRUMENT_FILE'
+TRACE_MEMORY_ENV = 'GTD_TRACE_MEMORY'
+PROFILE_ENV = 'GTD_PROFILE_STAGE'
+PROFILER_ENV = 'GTD_PROFILER'
+
+PROFILE_DIR = os.path.join(CACHE_DIR, 'profiles')
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); False where that is not possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def _rss_mb():
+    """Current and peak RSS in MB from /proc (Linux), falling back to the process-wide ru_maxrss."""
+    try:
+        with open('/proc/self/status') as file:
+            status = dict(line.split(':', 1) for line in file)
+        return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return None, max_rss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def _cpu_seconds():
+    """CPU time of this process plus that of finished child processes (e.g. the GDP script)."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+def count_rows(values):
+    """Total rows of the DataFrames and Series among `values`; None when there are none."""
+    frames = [value for value in values if isinstance(value, (pd.DataFrame, pd.Series))]
+    return sum(len(frame) for frame in frames) if frames else None
+
+def _output_values(result, n_outputs):
+    if n_outputs == 0 or result is None:
+        return []
+    return [result] if n_outputs == 1 else list(result)
+
+
+class StageRecorder:
+    """Wall time, CPU time, memory and row counts of each pipeline stage.
+
+    `mode` is 'table' (summary printed at the end), 'jsonl' (one JSON object per
+    stage, written as it finishes to `path` or stderr) or None. When disabled
+    and no stage is profiled, `run` calls the stage directly, so the only cost
+    is one attribute check per stage. Peak RSS is measured per stage where the
+    kernel high-water mark can be reset (Linux), otherwise it is the process
+    peak so far. `trace_memory` adds the tracemalloc peak of the stage, and
+    `profile_stage` runs that one stage under cProfile (or pyinstrument) and
+    saves the profile under .cache/profiles.
+    """
+
+    def __init__(self, mode=None, path=None, trace_memory=False, profile_stage=None, profiler='cprofile'):
+        if mode not in (None, 'table', 'jsonl'):
+            raise ValueError(f"Unknown instrumentation mode '{mode}'; use 'table' or 'jsonl'.")
+        self.mode = mode
+        self.path = path
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.records = []
+
+    @classmethod
+    def from_env(cls, mode=None, path=None, trace_memory=False, profile_stage=None, profiler=None):
+        """Recorder configured by the arguments, or the GTD_* environment variables where they are unset."""
+        return cls(mode or os.environ.get(INSTRUMENT_ENV) or None,
+                   path or os.environ.get(INSTRUMENT_FILE_ENV) or None,
+                   trace_memory or os.environ.get(TRACE_MEMORY_ENV, '') not in ('', '0'),
+                   profile_stage or os.environ.get(PROFILE_ENV) or None,
+                   profiler or os.environ.get(PROFILER_ENV) or 'cprofile')
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    def run(self, name, func, inputs, params, n_outputs=0):
+        """Call `func(**inputs, **params)`; returns its result and the stage's record (None when disabled)."""
+        if not self.enabled and name != self.profile_stage:
+            return func(**inputs, **params), None
+
+        per_stage_peak = _reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.start()
+        start, cpu_start = time.perf_counter(), _cpu_seconds()
+        if name == self.profile_stage:
+            result = self._profile(name, func, inputs, params)
+        else:
+            result = func(**inputs, **params)
+        record = {
+            'stage': name,
+            'wall_seconds': round(time.perf_counter() - start, 4),
+            'cpu_seconds': round(_cpu_seconds() - cpu_start, 4),
+        }
+        rss, peak_rss = _rss_mb()
+        record['rss_mb'] = None if rss is None else round(rss, 1)
+        record['peak_rss_mb'] = round(peak_rss, 1)
+        record['peak_rss_scope'] = 'stage' if per_stage_peak else 'process'
+        if self.trace_memory:
+            record['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        record['input_rows'] = count_rows(inputs.values())
+        record['output_rows'] = count_rows(_output_values(result, n_outputs))
+        record['pid'] = os.getpid()
+        return result, record
+
+    def _profile(self, name, func, inputs, params):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return func(**inputs, **params)
+            finally:
+                profiler.stop()
+                path = os.path.join(PROFILE_DIR, f'{name}.html')
+                with open(path, 'w') as file:
+                    file.write(profiler.output_html())
+                print(profiler.output_text(), file=sys.stderr)
+                print(f"[instrumentation] {name}: profile saved to {path}", file=sys.stderr)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, **inputs, **params)
+        finally:
+            path = os.path.join(PROFILE_DIR, f'{name}.prof')
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(20)
+            print(summary.getvalue(), file=sys.stderr)
+            print(f"[instrumentation] {name}: profile saved to {path}", file=sys.stderr)
+
+    def add(self, record):
+        """Keep a record (from `run` in this process or a worker) and emit it in JSON lines mode."""
+        if record is None or not self.enabled:
+            return
+        self.records.append(record)
+        if self.mode == 'jsonl':
+            line = json.dumps(record)
+            if self.path:
+                with open(self.path, 'a') as file:
+                    file.write(line + '\n')
+            else:
+                print(line, file=sys.stderr)
+
+    def add_cached(self, name):
+        self.add({'stage': name, 'cached': True})
+
+    def summary(self):
+        """The records as a DataFrame, one row per stage."""
+        return pd.DataFrame(self.records).set_index('stage') if self.records else pd.DataFrame()
+
+    def report(self):
+        if self.mode != 'table' or not self.records:
+            return
+        columns = ['wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_mb', 'tracemalloc_peak_mb',
+                   'input_rows', 'output_rows', 'cached']
+        summary = self.summary()
+        summary = summary[[col for col in columns if col in summary.columns]]
+        for col in ['input_rows', 'output_rows']:
+            if col in summary.columns:
+                summary[col] = summary[col].map(lambda rows: '-' if pd.isna(rows) else int(rows))
+        print("\n[instrumentation] Per-stage summary:")
+        print(summary.to_string(na_rep='-'))
+        print(f"[instrumentation] Total wall time of the stages run: {summary['wall_seconds'].sum():.3f}s"
+              if 'wall_seconds' in summary.columns else "[instrumentation] All stages were cached.")
@@ -0,0 +1,386 @@
+import contextlib
+import dis
+import glob
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from instrumentation import StageRecorder
+from utils import CACHE_DIR, file_fingerprint
+
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _is_project_object(obj):
+    module = sys.modules.get(getattr(obj, '__module__', None))
+    module_file = getattr(module, '__file__', None)
+    return module_file is not None and os.path.dirname(os.path.abspath(module_file)) == PROJECT_DIR
+
+def _project_module_file(name):
+    """Source file of a top-level project module, found without importing it; None for other modules."""
+    if '.' in name:
+        return None
+    module = sys.modules.get(name)
+    origin = getattr(module, '__file__', None) if module else getattr(importlib.util.find_spec(name), 'origin', None)
+    if origin is None or os.path.dirname(os.path.abspath(origin)) != PROJECT_DIR:
+        return None
+    return origin
+
+def _module_hash(name, seen):
+    """Hash of a project module's source file (once per fingerprint); '' for other modules."""
+    module_file = _project_module_file(name)
+    if module_file is None or module_file in seen:
+        return ''
+    seen.add(module_file)
+    return file_fingerprint(module_file)['sha256']
+
+PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+def _class_member_functions(member):
+    """Functions behind a class attribute: methods, classmethods, staticmethods and property accessors."""
+    if isinstance(member, (classmethod, staticmethod)):
+        member = member.__func__
+    if isinstance(member, property):
+        return [accessor for accessor in (member.fget, member.fset, member.fdel) if inspect.isfunction(accessor)]
+    return [member] if inspect.isfunction(member) else []
+
+def _object_hash(obj, seen):
+    """Hash of a global a stage refers to: the code of project functions and classes, the source
+    file of project modules (used through attributes, as `artifacts.store`), the repr of plain
+    data such as the column lists (containers included); '' for other objects."""
+    if isinstance(obj, PLAIN_TYPES):
+        return repr(obj)
+    if inspect.ismodule(obj):
+        return _module_hash(obj.__name__, seen)
+    if id(obj) in seen:
+        return ''
+    if isinstance(obj, (list, tuple, set, frozenset, dict)):
+        seen.add(id(obj))
+        items = obj.items() if isinstance(obj, dict) else enumerate(obj)
+        hashes = [f'{_object_hash(key, seen)}:{_object_hash(value, seen)}' for key, value in items]
+        return repr(sorted(hashes) if isinstance(obj, (set, frozenset)) else hashes)
+    if not (inspect.isfunction(obj) or inspect.isclass(obj)) or not _is_project_object(obj):
+        return ''
+    seen.add(id(obj))
+    functions = [obj] if inspect.isfunction(obj) else [
+        function for member in vars(obj).values() for function in _class_member_functions(member)
+    ]
+    return ''.join(_code_hash(function.__code__, function.__globals__, seen) for function in functions)
+
+def _code_hash(code, namespace=None, seen=None):
+    """Stable hash of a function's bytecode, constants and names, including nested code objects.
+
+    Functions and classes of this project that the code refers to by name are
+    hashed too, so editing a helper invalidates the stages that call it, and so
+    is the module-level data it reads (column lists, mappings). Project
+    modules it uses through attributes or imports inside the function (the
+    lazily imported detectors) are hashed by their source file, so they are
+    not imported just to be hashed.
+    """
+    namespace = namespace or {}
+    seen = set() if seen is None else seen
+    sha256 = hashlib.sha256(code.co_code)
+    sha256.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        sha256.update((_code_hash(const, namespace, seen) if hasattr(const, 'co_code') else repr(const)).encode())
+
+    for name in code.co_names:
+        if name in namespace:
+            sha256.update(_object_hash(namespace[name], seen).encode())
+
+    for instruction in dis.get_instructions(code):
+        if instruction.opname == 'IMPORT_NAME':
+            sha256.update(_module_hash(instruction.argval, seen).encode())
+    return sha256.hexdigest()
+
+
+def share_frame(frame, directory, name):
+    """Write a DataFrame (with its index) to an uncompressed Arrow IPC file that workers can memory-map."""
+    path = os.path.join(directory, f"{name}.arrow")
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+def open_shared_frame(path, columns=None):
+    """Map a shared frame and convert only `columns` (and the index) to pandas; numeric
+    columns without nulls stay views of the mapped file instead of being copied."""
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        index_columns = [col for col in table.schema.pandas_metadata['index_columns'] if isinstance(col, str)]
+        table = table.select([col for col in table.column_names if col in columns or col in index_columns])
+    return table.to_pandas(split_blocks=True)
+
+class _Tee(io.TextIOBase):
+    """Writes to the real stdout and keeps a copy, so a stage's report can be stored with its cache."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = io.StringIO()
+
+    def write(self, text):
+        self.copy.write(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return self.copy.getvalue()
+
+def _run_stage_in_worker(name, func, shared_inputs, values, params, recorder, n_outputs):
+    """Process-pool entry point: map the shared frames, run the stage and capture its printed report."""
+    inputs = {input_name: open_shared_frame(path, columns) for input_name, (path, columns) in shared_inputs.items()}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result, record = recorder.run(name, func, {**inputs, **values}, params, n_outputs)
+    return result, output.getvalue(), record
+
+
+class Stage:
+    """A named unit of work with declared inputs, outputs and parameters.
+
+    `func` is called with the input artifacts and the parameters as keyword
+    arguments and returns its outputs in the order they are declared (a single
+    value for one output, a tuple for several, nothing for report-only stages).
+    `files` are external files whose content is part of the fingerprint and
+    `artifacts` are files the stage writes, which must exist for a cache hit.
+    Stages marked `parallel` have no side effects besides printing and may run
+    in a worker process alongside other parallel stages. `columns` maps a
+    DataFrame input to the columns the stage reads from it (parameter values
+    naming columns, such as `by`, are added); only those are shared with its
+    worker, and a stage run in this process gets the same columns.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, files=(), artifacts=(), parallel=False,
+                 columns=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.files = list(files)
+        self.artifacts = list(artifacts)
+        self.parallel = parallel
+        self.columns = dict(columns or {})
+
+    def shared_columns(self, input_name, params, available):
+        """Columns of the DataFrame input `input_name` a worker needs; None for all of them."""
+        if input_name not in self.columns:
+            return None
+        named = {value for param in params.values()
+                 for value in (param if isinstance(param, (list, tuple)) else [param]) if isinstance(value, str)}
+        return [col for col in available if col in self.columns[input_name] or col in named]
+
+    def select_columns(self, input_name, value, params):
+        """The input as the stage sees it, so a stage run in this process gets the same columns as in a worker."""
+        if not isinstance(value, pd.DataFrame):
+            return value
+        columns = self.shared_columns(input_name, params, value.columns)
+        return value if columns is None else value[columns]
+
+
+class Pipeline:
+    """Runs stages in dependency order and skips stages whose cached outputs are still valid.
+
+    A stage's fingerprint covers its name, code, parameters, external files and
+    the fingerprints of the stages producing its inputs, so changing one
+    parameter only reruns that stage and the stages downstream of it. What a
+    stage prints is stored next to its outputs and printed again on a cache
+    hit, so report-only stages still show their report.
+    """
+
+    def __init__(self, stages, cache_dir=os.path.join(CACHE_DIR, 'stages')):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache_dir = cache_dir
+        self.producers = {}
+        for stage in stages:
+            for name in stage.inputs:
+                if name not in self.producers:
+                    raise ValueError(f"Stage '{stage.name}' needs '{name}', which no earlier stage produces.")
+            for name in stage.outputs:
+                self.producers[name] = stage.name
+
+    def required_stages(self, targets=None):
+        if targets is None:
+            return list(self.stages)
+        required = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name in required:
+                continue
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'. Available stages: {list(self.stages)}")
+            required.add(name)
+            pending.extend(self.producers[input_name] for input_name in self.stages[name].inputs)
+        return [name for name in self.stages if name in required]
+
+    def _fingerprint(self, stage, params, fingerprints):
+        payload = {
+            'name': stage.name,
+            'code': _code_hash(stage.func.__code__, stage.func.__globals__),
+            'params': repr(sorted(params.items())),
+            'columns': repr(sorted(stage.columns.items())),
+            'files': [file_fingerprint(path)['sha256'] if os.path.exists(path) else None for path in stage.files],
+            'inputs': [fingerprints[self.producers[name]] for name in stage.inputs],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _cache_path(self, stage_name, fingerprint):
+        return os.path.join(self.cache_dir, f"{stage_name}-{fingerprint}.pkl")
+
+    @staticmethod
+    def _report_path(cache_path):
+        return f"{os.path.splitext(cache_path)[0]}.txt"
+
+    def _remove_cached(self, stage_name):
+        for path in glob.glob(self._cache_path(stage_name, '*')) + glob.glob(self._report_path(self._cache_path(stage_name, '*'))):
+            os.remove(path)
+
+    def invalidate(self, artifacts):
+        """Drop the cached outputs of the stages that write any of `artifacts`, so they run again
+        after something else (the chunked mode) has replaced those files."""
+        artifacts = set(artifacts)
+        for name, stage in self.stages.items():
+            if artifacts.intersection(stage.artifacts):
+                self._remove_cached(name)
+
+    def run(self, targets=None, params=None, force=(), max_workers=1, recorder=None, store=None):
+        """Run `targets` (all stages by default) and everything they depend on.
+
+        `params` maps stage names to parameter overrides and `force` lists stages
+        to rerun even when their cache is valid. With `max_workers` > 1,
+        consecutive independent parallel stages run together in a process pool;
+        DataFrame inputs are shared with the workers through memory-mapped Arrow
+        files instead of being pickled. `recorder` (a `StageRecorder`) measures
+        every stage that runs, in workers too, and reports at the end. `store`
+        (an `ArtifactStore`) writes the stages' files in the background; the
+        run waits for those writes before starting worker processes and before
+        returning. Returns the artifacts produced or loaded from the cache
+        during this run.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        params = params or {}
+        recorder = recorder or StageRecorder()
+        fingerprints = {}
+        cache_paths = {}
+        values = {}
+
+        def load(name):
+            if name not in values:
+                producer = self.producers[name]
+                with open(cache_paths[producer], 'rb') as file:
+                    values.update(zip(self.stages[producer].outputs, pickle.load(file)))
+            return values[name]
+
+        pending = []
+        for name in self.required_stages(targets):
+            stage = self.stages[name]
+            stage_params = {**stage.params, **params.get(name, {})}
+            fingerprints[name] = self._fingerprint(stage, stage_params, fingerprints)
+            cache_paths[name] = self._cache_path(name, fingerprints[name])
+
+            cached = all(os.path.exists(path) for path in
+                         [cache_paths[name], self._report_path(cache_paths[name]), *stage.artifacts])
+            if cached and name not in force:
+                print(f"[pipeline] {name}: cached ({fingerprints[name]})")
+                with open(self._report_path(cache_paths[name])) as file:
+                    print(file.read(), end='')
+                recorder.add_cached(name)
+                continue
+
+            if pending and not self._joins_batch(stage, pending):
+                self._run_batch(pending, load, values, cache_paths, max_workers, recorder, store)
+                pending = []
+            pending.append((name, stage_params))
+
+        if pending:
+            self._run_batch(pending, load, values, cache_paths, max_workers, recorder, store)
+        if store is not None:
+            store.wait()
+        recorder.report()
+        return values
+
+    def _joins_batch(self, stage, batch):
+        """A parallel stage can join a batch of parallel stages that produce none of its inputs."""
+        batch_stages = [self.stages[name] for name, _ in batch]
+        batch_outputs = {output for batch_stage in batch_stages for output in batch_stage.outputs}
+        return (stage.parallel and all(batch_stage.parallel for batch_stage in batch_stages)
+                and batch_outputs.isdisjoint(stage.inputs))
+
+    def _run_batch(self, batch, load, values, cache_paths, max_workers, recorder, store=None):
+        if max_workers > 1 and len(batch) > 1 and all(self.stages[name].parallel for name, _ in batch):
+            if store is not None:
+                # Forking while writer threads hold locks could deadlock the workers
+                store.wait()
+            results, reports = self._run_parallel(batch, load, max_workers, recorder)
+        else:
+            results, reports = [], []
+            for name, stage_params in batch:
+                print(f"[pipeline] {name}: running")
+                stage = self.stages[name]
+                inputs = {input_name: stage.select_columns(input_name, load(input_name), stage_params)
+                          for input_name in stage.inputs}
+                output = _Tee(sys.stdout)
+                with contextlib.redirect_stdout(output):
+                    result, record = recorder.run(name, stage.func, inputs, stage_params, len(stage.outputs))
+                recorder.add(record)
+                results.append(result)
+                reports.append(output.getvalue())
+
+        for (name, _), result, report in zip(batch, results, reports):
+            stage = self.stages[name]
+            if len(stage.outputs) == 1:
+                result = (result,)
+            result = tuple(result) if stage.outputs else ()
+            values.update(zip(stage.outputs, result))
+
+            self._remove_cached(name)
+            with open(cache_paths[name], 'wb') as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self._report_path(cache_paths[name]), 'w') as file:
+                file.write(report)
+
+    def _run_parallel(self, batch, load, max_workers, recorder):
+        print(f"[pipeline] {', '.join(name for name, _ in batch)}: running in parallel")
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as shared_dir:
+            shared = {}
+            futures = []
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(batch))) as executor:
+                for name, stage_params in batch:
+                    stage = self.stages[name]
+                    shared_inputs, plain_inputs = {}, {}
+                    for input_name in stage.inputs:
+                        value = load(input_name)
+                        if isinstance(value, pd.DataFrame):
+                            if input_name not in shared:
+                                shared[input_name] = share_frame(value, shared_dir, input_name)
+                            shared_inputs[input_name] = (shared[input_name],
+                                                         stage.shared_columns(input_name, stage_params, value.columns))
+                        else:
+                            plain_inputs[input_name] = value
+                    futures.append(executor.submit(_run_stage_in_worker, name, stage.func, shared_inputs,
+                                                   plain_inputs, stage_params, recorder, len(stage.outputs)))
+
+                results, reports = [], []
+                for (name, _), future in zip(batch, futures):
+                    result, report, record = future.result()
+                    print(f"[pipeline] {name}: done")
+                    print(report, end='')
+                    recorder.add(record)
+                    results.append(result)
+                    reports.append(report)
+        return results, reports
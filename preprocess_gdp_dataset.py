@@ -1,89 +1,125 @@
-import pandas as pd
+import glob
+import os
 import zipfile
 
-# --- Uniqueness ---
-def get_unique_terrorism_countries(zip_file_path, file_name):
-    with zipfile.ZipFile(zip_file_path, 'r') as z:
-        with z.open(file_name) as file:
-            terrorism_df = pd.read_csv(file, encoding='ISO-8859-1', low_memory=False)
-    return set(terrorism_df['country_txt'].unique())
+import pandas as pd
 
-unique_terrorism_countries = get_unique_terrorism_countries('GlobalTerrorismDataset.zip', 'globalterrorismdb_0718dist.csv')
+from utils import CACHE_DIR, DATASET_CSV, code_version, file_fingerprint, read_dataset
+
+DATASET_ZIP = 'GlobalTerrorismDataset.zip'
+MADDISON_ZIP = 'GDP_Maddison_Project_Database.zip'
+MADDISON_XLSX = 'GDP_Maddison_Project_Database.xlsx'
+WORLD_BANK_ZIP = 'GDP_World_Bank_Group.zip'
+WORLD_BANK_CSV = 'GDP_World_Bank_Group.csv'
+GDP_ARTIFACT = 'Preprocessed_GDP_Dataset'
+GDP_CSV = f'{GDP_ARTIFACT}.csv'
+
+FIRST_YEAR = 1970
+LAST_YEAR = 2017
+
+# --- Uniqueness ---
+def get_unique_terrorism_countries(zip_file_path=DATASET_ZIP, file_name=DATASET_CSV):
+    """Distinct `country_txt` values, parsing only that column of the GTD CSV."""
+    countries = read_dataset(zip_file_path, columns=['country_txt'], file_name=file_name)['country_txt']
+    return set(countries.dropna().unique())
 
 country_name_mapping = {
-    "Bahamas, The": "Bahamas", "Bosnia and Herzegovina": "Bosnia-Herzegovina", "Brunei Darussalam": "Brunei", 
-    "Congo, Rep.": "Republic of the Congo", "Czechia": "Czech Republic", "Egypt, Arab Rep.": "Egypt", 
-    "Gambia, The": "Gambia", "Hong Kong SAR, China": "Hong Kong", "Iran, Islamic Rep.": "Iran", 
-    "Cote d'Ivoire": "Ivory Coast", "Kazakhstan": "Kazakhstan", "Kyrgyz Republic": "Kyrgyzstan", 
-    "Lao PDR": "Laos", "Macao SAR, China": "Macau", "North Macedonia": "Macedonia", 
-    "Korea, Dem. People's Rep.": "North Korea", "Russian Federation": "Russia", "Korea": "South Korea", 
-    "Eswatini": "Swaziland", "Syrian Arab Republic": "Syria", "Taiwan, Province of China": "Taiwan", 
-    "Turkiye": "Turkey", "Yemen, Rep.": "South Yemen", "Congo, Dem. Rep.": "People's Republic of the Congo", 
-    "Former Yugoslavia": "Yugoslavia", "Timor-Leste": "East Timor", "Former USSR": "Soviet Union", 
+    "Bahamas, The": "Bahamas", "Bosnia and Herzegovina": "Bosnia-Herzegovina", "Brunei Darussalam": "Brunei",
+    "Congo, Rep.": "Republic of the Congo", "Czechia": "Czech Republic", "Egypt, Arab Rep.": "Egypt",
+    "Gambia, The": "Gambia", "Hong Kong SAR, China": "Hong Kong", "Iran, Islamic Rep.": "Iran",
+    "Cote d'Ivoire": "Ivory Coast", "Kazakhstan": "Kazakhstan", "Kyrgyz Republic": "Kyrgyzstan",
+    "Lao PDR": "Laos", "Macao SAR, China": "Macau", "North Macedonia": "Macedonia",
+    "Korea, Dem. People's Rep.": "North Korea", "Russian Federation": "Russia", "Korea": "South Korea",
+    "Eswatini": "Swaziland", "Syrian Arab Republic": "Syria", "Taiwan, Province of China": "Taiwan",
+    "Turkiye": "Turkey", "Yemen, Rep.": "South Yemen", "Congo, Dem. Rep.": "People's Republic of the Congo",
+    "Former Yugoslavia": "Yugoslavia", "Timor-Leste": "East Timor", "Former USSR": "Soviet Union",
     "Zimbabwe": "Rhodesia", "Viet Nam": "South Vietnam", "Vanuatu": "New Hebrides", "Venezuela, RB": "Venezuela"
 }
 
-def process_maddison_project(zip_file_path, file_name, sheet_name='GDPpc'):
+additional_mappings = {
+    "Zaire": "Congo, Dem. Rep.", "Serbia-Montenegro": "Serbia", "West Germany (FRG)": "Germany",
+    "East Germany (GDR)": "Germany", "Vatican City": "Italy", "Wallis and Futuna": "France",
+    "French Guiana": "France", "Martinique": "France", "Guadeloupe": "France"
+}
+
+countries_with_blank_gdp = ["Western Sahara", "International", "South Sudan", "Falkland Islands"]
+
+def process_maddison_project(zip_file_path=MADDISON_ZIP, file_name=MADDISON_XLSX, sheet_name='GDPpc',
+                            cache_dir=CACHE_DIR):
+    """Year/country/GDP rows of the former countries from the Maddison sheet.
+
+    Parsing the xlsx is the slow part, so the result is cached as Parquet keyed
+    on the zip's hash, the sheet name and the version of this function's code
+    and year range; later runs only read that file.
+    """
+    countries = ['Taiwan, Province of China', 'Former Yugoslavia', 'Czechoslovakia', 'Former USSR']
+    version = code_version([process_maddison_project], [FIRST_YEAR, LAST_YEAR])
+    cache_path = os.path.join(
+        cache_dir, f"Maddison-{sheet_name}-{file_fingerprint(zip_file_path)['sha256'][:16]}-{version}.parquet")
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
     with zipfile.ZipFile(zip_file_path, 'r') as z:
         with z.open(file_name) as file:
-            df = pd.read_excel(file, sheet_name=sheet_name)
-    
-    countries = ['Taiwan, Province of China', 'Former Yugoslavia', 'Czechoslovakia', 'Former USSR']
+            df = pd.read_excel(file, sheet_name=sheet_name, usecols=['GDP pc 2011 prices'] + countries)
+
     df['GDP pc 2011 prices'] = pd.to_numeric(df['GDP pc 2011 prices'], errors='coerce')
-    df_filtered = df[['GDP pc 2011 prices'] + countries]
-    df_filtered = df_filtered.dropna(subset=['GDP pc 2011 prices'])
-    df_filtered = df_filtered[df_filtered['GDP pc 2011 prices'].between(1970, 2017)]
+    df_filtered = df.dropna(subset=['GDP pc 2011 prices'])
+    df_filtered = df_filtered[df_filtered['GDP pc 2011 prices'].between(FIRST_YEAR, LAST_YEAR)]
     df_filtered = df_filtered.rename(columns={'GDP pc 2011 prices': 'Year'})
     df_melted = df_filtered.melt(id_vars=["Year"], var_name="Country Name", value_name="GDP")
+    df_melted['GDP'] = pd.to_numeric(df_melted['GDP'], errors='coerce')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale_path in glob.glob(os.path.join(cache_dir, f'Maddison-{sheet_name}-*.parquet')):
+        os.remove(stale_path)
+    df_melted.to_parquet(cache_path, index=False)
     return df_melted
 
-def process_world_bank(zip_file_path, file_name):
+def process_world_bank(zip_file_path=WORLD_BANK_ZIP, file_name=WORLD_BANK_CSV):
+    years = [str(year) for year in range(FIRST_YEAR, LAST_YEAR + 1)]
     with zipfile.ZipFile(zip_file_path, 'r') as z:
         with z.open(file_name) as file:
-            df = pd.read_csv(file, skiprows=4, low_memory=False)
-    
-    df = df.drop(columns=['Country Code', 'Indicator Name', 'Indicator Code'])
-    years = [str(year) for year in range(1970, 2018)]
-    df = df[['Country Name'] + years]
+            df = pd.read_csv(file, skiprows=4, usecols=['Country Name'] + years)
+
     df_melted = df.melt(id_vars=["Country Name"], var_name="Year", value_name="GDP")
+    df_melted['Year'] = pd.to_numeric(df_melted['Year'])
     return df_melted
 
 # --- Integration ---
-maddison_data = process_maddison_project('GDP_Maddison_Project_Database.zip', 'GDP_Maddison_Project_Database.xlsx')
-world_bank_data = process_world_bank('GDP_World_Bank_Group.zip', 'GDP_World_Bank_Group.csv')
-
-combined_data = pd.concat([maddison_data, world_bank_data])
-
-combined_data['Country Name'] = combined_data['Country Name'].replace(country_name_mapping)
-
-filtered_data = combined_data[combined_data['Country Name'].isin(unique_terrorism_countries)]
-
-additional_mappings = {
-    "Zaire": "Congo, Dem. Rep.", "Serbia-Montenegro": "Serbia", "West Germany (FRG)": "Germany", 
-    "East Germany (GDR)": "Germany", "Vatican City": "Italy", "Wallis and Futuna": "France", 
-    "French Guiana": "France", "Martinique": "France", "Guadeloupe": "France"
-}
-
-for new_country, ref_country in additional_mappings.items():
-    new_country_data = filtered_data[filtered_data['Country Name'] == ref_country].copy()
-    new_country_data['Country Name'] = new_country
-    filtered_data = pd.concat([filtered_data, new_country_data])
-
-countries_with_blank_gdp = ["Western Sahara", "International", "South Sudan", "Falkland Islands"]
-for country in countries_with_blank_gdp:
-    blank_data = pd.DataFrame({
-        "Year": range(1970, 2018),
-        "Country Name": country,
-        "GDP": [None] * (2018 - 1970)
-    })
-    filtered_data = pd.concat([filtered_data, blank_data])
-
-filtered_data.loc[:, 'Year'] = pd.to_numeric(filtered_data['Year'], errors='coerce')
-
-# --- Handling Missing Values ---
-filtered_data['GDP'] = filtered_data['GDP'].fillna(-99)
-
-# --- Rename and Sort ---
-filtered_data_sorted = filtered_data.rename(columns={"Country Name": "Country"}).sort_values(by=["Country", "Year"])
-
-filtered_data_sorted.to_csv('Preprocessed_GDP_Dataset.csv', index=False)
+def build_gdp_dataset(terrorism_countries=None, dataset_zip=DATASET_ZIP):
+    """GDP per Country and Year for the countries of the terrorism dataset, as a DataFrame.
+
+    `terrorism_countries` defaults to the `country_txt` values of `dataset_zip`.
+    Aliased countries (e.g. West Germany) copy the GDP of their reference
+    country and a few countries get blank rows; both are built as frames and
+    added in one concat. Missing GDP is -99.
+    """
+    if terrorism_countries is None:
+        terrorism_countries = get_unique_terrorism_countries(dataset_zip)
+
+    combined_data = pd.concat([process_maddison_project(), process_world_bank()], ignore_index=True)
+    combined_data['Country Name'] = combined_data['Country Name'].replace(country_name_mapping)
+    filtered_data = combined_data[combined_data['Country Name'].isin(set(terrorism_countries))]
+
+    aliases = pd.DataFrame(list(additional_mappings.items()), columns=['Alias', 'Country Name'])
+    alias_data = (aliases.merge(filtered_data, on='Country Name')
+                  .drop(columns='Country Name').rename(columns={'Alias': 'Country Name'}))
+    blank_data = pd.MultiIndex.from_product(
+        [countries_with_blank_gdp, range(FIRST_YEAR, LAST_YEAR + 1)], names=['Country Name', 'Year']
+    ).to_frame(index=False).assign(GDP=float('nan'))
+
+    filtered_data = pd.concat([filtered_data, alias_data, blank_data], ignore_index=True)
+    filtered_data['Year'] = pd.to_numeric(filtered_data['Year'], errors='coerce')
+
+    # --- Handling Missing Values ---
+    filtered_data['GDP'] = filtered_data['GDP'].fillna(-99)
+
+    # --- Rename and Sort ---
+    return (filtered_data[['Year', 'Country Name', 'GDP']].rename(columns={"Country Name": "Country"})
+            .sort_values(by=["Country", "Year"], kind='stable').reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    build_gdp_dataset().to_csv(GDP_CSV, index=False)
+    print(f"GDP dataset saved to {GDP_CSV}")
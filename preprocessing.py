@@ -1,81 +1,29 @@
+import ast
+import sys
+
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
-from sklearn.neighbors import LocalOutlierFactor
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-from sklearn.decomposition import PCA
-from utils import extract_dataset
-from datetime import datetime
-import subprocess
-import os
-from scipy.stats import t
-import numpy as np
-
-pd.set_option('display.max_rows', None)
-pd.set_option('display.max_columns', None)
-
-if not os.path.exists('Preprocessed_GDP_Dataset.csv'):
-    subprocess.run(["python3", "preprocess_gdp_dataset.py"])
-
-dataset_file_path = extract_dataset('GlobalTerrorismDataset.zip')
-df = pd.read_csv(dataset_file_path, encoding='ISO-8859-1')
-
-# --- DATA COLLECTION ---
-db_source_counts = df['dbsource'].value_counts(normalize=True) * 100
-
-top_4_db_sources = db_source_counts.head(4).to_frame(name='Contribution Percentage')
-others_percentage = pd.DataFrame({'Contribution Percentage': [db_source_counts.iloc[4:].sum()]}, index=['Others'])
-
-db_sources_summary = pd.concat([top_4_db_sources, others_percentage])
-db_sources_summary.index.name = 'Database Source'
-
-print("Database Sources:\n")
-print(db_sources_summary.to_string(float_format="{:,.6f}".format))
-
-# --- DATA QUALITY ---
-# Completeness
-missing_values = df.isnull().sum()
-completeness_percentage = (1 - (missing_values / len(df))) * 100
-
-completeness_analysis = pd.DataFrame({
-    'Missing Values Count': missing_values,
-    'Completeness Percentage': completeness_percentage
-})
-
-print('\nCompleteness Analysis:\n', completeness_analysis)
-
-columns_50p_missing = completeness_analysis[completeness_analysis['Completeness Percentage'] < 50].index
-if not columns_50p_missing.empty:
-    print(f'\nColumns with More Than 50% Missing Values:\n{columns_50p_missing.tolist()}')
-else:
-    print('No columns have more than 50% missing values.')
-
-# Uniqueness
-unique_counts = df.nunique()
-
-uniqueness_analysis = pd.DataFrame({
-    'Unique Values Count': unique_counts,
-})
-
-print('\nUniqueness Analysis:\n', uniqueness_analysis)
-
-duplicate_count = df.duplicated().sum()
-if duplicate_count > 0:
-    print(f'\nThere are {duplicate_count} duplicate rows in the dataset.')
-else:
-    print('\nNo duplicate rows found in the dataset.\n')
-
-# Accuracy Checks
-invalid_kill_counts = df[df['nkill'] < 0]
-if not invalid_kill_counts.empty:
-    print(f'\nInvalid kill counts found:\n{invalid_kill_counts[["eventid", "nkill"]]}')
-
-# Check for missing values in year, month, and day
-required_columns = ['iyear', 'imonth', 'iday']
-missing_columns = [col for col in required_columns if col not in df.columns]
-if missing_columns:
-     print(f'Missing columns: {missing_columns}')
+# scikit-learn and scipy are imported inside the stages that use them, so importing
+# this module (for the quality report, the notebooks or cli.py) stays cheap
+from utils import load_dataset, read_dataset, fill_category, compact_frame
+from aggregation import calculate_duration, calculate_casualties
+from gdp_lookup import GDPLookup
+import artifacts
+from preprocess_gdp_dataset import GDP_ARTIFACT, MADDISON_ZIP, WORLD_BANK_ZIP, build_gdp_dataset
+from pipeline import Stage, Pipeline
+from data_quality import DataQualityProfiler
+from sampling import stratified_sample
+from statistical_outliers import group_codes, grouped_z_scores, generalized_esd
+from rules import load_rule_sets
+from cube import CUBE_ARTIFACT, AggregateCube
+
+DATASET_ZIP = 'GlobalTerrorismDataset.zip'
+# Persisted artifacts, written by `artifacts.store` as .parquet (and .csv with --export-csv)
+PREPROCESSED_ARTIFACT = 'Preprocessed_Global_Terrorism_Dataset'
+PCA_ARTIFACT = 'PCA_Analysis'
+ANOMALIES_ARTIFACT = 'Detected_Anomalies'
+FILTERED_ARTIFACT = 'Filtered_Global_Terrorism_Dataset'
+RULES_JSON = 'rules.json'
 
 # --- Selection Of The Subset Of Attributes ---
 selected_columns = [
@@ -85,8 +33,6 @@ selected_columns = [
     'nkill', 'nwound', 'nkillus', 'nwoundus', 'dbsource'
 ]
 
-print(f'\n\nSelected Columns:\n{selected_columns}\n')
-
 # --- Define Data Types ---
 attribute_classification = {
     'Nominal': [
@@ -104,8 +50,6 @@ attribute_classification = {
     ]
 }
 
-filtered_df = df[selected_columns]
-
 column_renaming = {
     'iyear': 'Year', 'imonth': 'Month', 'iday': 'Day', 'extended': 'Extended', 
     'resolution': 'Resolution', 'country_txt': 'Country', 'region_txt': 'Region', 
@@ -118,168 +62,230 @@ column_renaming = {
     'dbsource': 'Database Source'
 }
 
-filtered_df = filtered_df.rename(columns=column_renaming)
-
-# --- Aggregated columns ---
-def is_valid_date(year, month, day):
-    """Check if the given year, month, day form a valid date."""
-    try:
-        datetime(year, month, day)
-        return True
-    except ValueError:
-        return False
+feature_columns = ['Number of Killed US People', 'Number of Wounded US People']
+density_combo = ['Number of Killed People', 'Duration']
+clustering_combo = ['Weapon Type', 'Attack Type']
+pca_numeric_columns = ['nperps', 'nkill', 'suicide', 'success']
+pca_scale_columns = ['nperps', 'nkill']
+anomaly_columns = ['Anomaly Score', 'Z Score', 'Detection Method', 'Year', 'Country', 'Number of Killed People', 'Duration', 'Weapon Type', 'Attack Type']
+# Raw columns the stages read from the extracted dataset
+extract_columns = list(dict.fromkeys(selected_columns + pca_numeric_columns + ['attacktype1', 'weaptype1']))
 
-def calculate_duration(row):
-    if not is_valid_date(row['Year'], row['Month'], row['Day']):
-        return -99
-    
-    if row['Extended'] == 1 and pd.notnull(row['Resolution']):
-        attack_date = datetime(row['Year'], row['Month'], row['Day'])
-        try:
-            resolution_date = datetime.strptime(row['Resolution'], "%m/%d/%Y")
-            return (resolution_date - attack_date).days
-        except ValueError:
-            return 1
-    return 1
-
-filtered_df['Duration'] = filtered_df.apply(calculate_duration, axis=1)
-filtered_df = filtered_df.drop(columns=['Extended', 'Resolution'])
-
-def calculate_casualties(row):
-    if pd.isnull(row['Number of Killed People']) or pd.isnull(row['Number of Wounded People']):
-        return -99
-    return row['Number of Killed People'] + row['Number of Wounded People']
-
-filtered_df['Number of Casualties'] = filtered_df.apply(calculate_casualties, axis=1)
-
-# Replace null values with -99
-filtered_df['Number of Terrorists'] = filtered_df['Number of Terrorists'].fillna(-99)
-filtered_df['Number of Killed People'] = filtered_df['Number of Killed People'].fillna(-99)
-filtered_df['Number of Wounded People'] = filtered_df['Number of Wounded People'].fillna(-99)
-filtered_df['Number of Killed US People'] = filtered_df['Number of Killed US People'].fillna(-99)
-filtered_df['Number of Wounded US People'] = filtered_df['Number of Wounded US People'].fillna(-99)
-filtered_df['Target Nationality'] = filtered_df['Target Nationality'].fillna('Unknown')
 
-# --- Sample Selection ---
-filtered_df['Decade'] = (filtered_df['Year'] // 10) * 10
+# --- Integration ---
+def build_gdp(df):
+    # GDP for the countries of the loaded dataset, built in memory; the saved file is an output only
+    gdp_df = build_gdp_dataset(df['country_txt'].unique())
+    artifacts.store.save(gdp_df, GDP_ARTIFACT)
+    return GDPLookup.from_frame(gdp_df)
 
-sampling_fraction = 0.1
+def extract(dataset_zip=DATASET_ZIP, columns=tuple(extract_columns)):
+    # Only the columns the stages use, read from the typed Parquet cache
+    return load_dataset(dataset_zip, columns=list(columns))
 
-# Sample 10% of each group by Decade and Region
-sampled_df = filtered_df.groupby(['Decade', 'Region']).apply(lambda x: x.sample(frac=sampling_fraction, random_state=1)).reset_index(drop=True)
+# --- DATA COLLECTION ---
+def quality_report(dataset_zip=DATASET_ZIP, chunksize=50_000):
+    # One streaming pass over the raw CSV text feeds every section of the report
+    profiler = DataQualityProfiler()
+    db_source_totals = pd.Series(dtype=np.int64)
+    invalid_kill_chunks = []
+    for chunk in read_dataset(dataset_zip, chunksize=chunksize, dtype=str):
+        profiler.update(chunk)
+        db_source_totals = db_source_totals.add(chunk['dbsource'].value_counts(), fill_value=0)
+        invalid_kill_chunks.append(chunk.loc[pd.to_numeric(chunk['nkill'], errors='coerce') < 0, ['eventid', 'nkill']])
 
-# --- Integration ---
-#  Merge GDP Data
-gdp_df = pd.read_csv('Preprocessed_GDP_Dataset.csv')
+    db_source_counts = db_source_totals.sort_values(ascending=False) / db_source_totals.sum() * 100
 
-merged_df = pd.merge(filtered_df, gdp_df, how='left', left_on=['Year', 'Country'], right_on=['Year', 'Country'])
+    top_4_db_sources = db_source_counts.head(4).to_frame(name='Contribution Percentage')
+    others_percentage = pd.DataFrame({'Contribution Percentage': [db_source_counts.iloc[4:].sum()]}, index=['Others'])
 
-merged_df = merged_df.drop(columns=['Country'])
+    db_sources_summary = pd.concat([top_4_db_sources, others_percentage])
+    db_sources_summary.index.name = 'Database Source'
 
-output_file_path = 'Preprocessed_Global_Terrorism_Dataset.csv'
-merged_df.to_csv(output_file_path, index=False)
+    print("Database Sources:\n")
+    print(db_sources_summary.to_string(float_format="{:,.6f}".format))
 
-print(f'Data saved to {output_file_path} with selected columns, new names, and GDP information.')
+    # --- DATA QUALITY ---
+    # Completeness
+    completeness_analysis = profiler.completeness()
 
-print("Type of Attributes Classification:")
-for attribute_type, columns in attribute_classification.items():
-    print(f"\n{attribute_type} Attributes:")
-    for col in columns:
-        print(f" - {col}")
+    print('\nCompleteness Analysis:\n', completeness_analysis)
 
-# --- Discretization ---
-bins = [0, 10, 100, 500, 1000, 1570]
-labels = ['0-10', '11-100', '101-500', '501-1000', '1001-1570']
-df['victim_range'] = pd.cut(df['nkill'], bins=bins, labels=labels, right=True)
+    columns_50p_missing = completeness_analysis[completeness_analysis['Completeness Percentage'] < 50].index
+    if not columns_50p_missing.empty:
+        print(f'\nColumns with More Than 50% Missing Values:\n{columns_50p_missing.tolist()}')
+    else:
+        print('No columns have more than 50% missing values.')
 
-df_cleaned = df.dropna(subset=['nkill', 'victim_range'])
+    # Uniqueness
+    uniqueness_analysis = profiler.uniqueness()
 
-victim_distribution = df_cleaned['victim_range'].value_counts()
-print(f'\nBinning:\n{victim_distribution}')
+    print('\nUniqueness Analysis:\n', uniqueness_analysis)
 
-# Decade Distribution
-bins_decades = [1970, 1980, 1990, 2000, 2010, 2020]  
-labels_decades = ['1970s', '1980s', '1990s', '2000s', '2010s']  
-df['decade'] = pd.cut(df['iyear'], bins=bins_decades, labels=labels_decades, right=False)
+    duplicate_count = profiler.duplicate_count()
+    if duplicate_count > 0:
+        print(f'\nThere are {duplicate_count} duplicate rows in the dataset.')
+    else:
+        print('\nNo duplicate rows found in the dataset.\n')
+
+    # Accuracy Checks
+    invalid_kill_counts = pd.concat(invalid_kill_chunks)
+    if not invalid_kill_counts.empty:
+        print(f'\nInvalid kill counts found:\n{invalid_kill_counts[["eventid", "nkill"]]}')
+
+    # Check for missing values in year, month, and day
+    required_columns = ['iyear', 'imonth', 'iday']
+    missing_columns = [col for col in required_columns if col not in profiler.columns]
+    if missing_columns:
+         print(f'Missing columns: {missing_columns}')
+
+def derive_columns(df):
+    """Selected and renamed columns with Duration, Casualties and the -99 fills; row-local, so it also runs per chunk."""
+    filtered_df = df[selected_columns].rename(columns=column_renaming)
+
+    # --- Aggregated columns ---
+    filtered_df['Duration'] = calculate_duration(filtered_df)
+    filtered_df = filtered_df.drop(columns=['Extended', 'Resolution'])
+
+    filtered_df['Number of Casualties'] = calculate_casualties(filtered_df)
+
+    # Replace null values with -99
+    filtered_df['Number of Terrorists'] = filtered_df['Number of Terrorists'].fillna(-99)
+    filtered_df['Number of Killed People'] = filtered_df['Number of Killed People'].fillna(-99)
+    filtered_df['Number of Wounded People'] = filtered_df['Number of Wounded People'].fillna(-99)
+    filtered_df['Number of Killed US People'] = filtered_df['Number of Killed US People'].fillna(-99)
+    filtered_df['Number of Wounded US People'] = filtered_df['Number of Wounded US People'].fillna(-99)
+    filtered_df['Target Nationality'] = fill_category(filtered_df['Target Nationality'], 'Unknown')
+    return filtered_df
+
+def select_and_derive(df):
+    print(f'\n\nSelected Columns:\n{selected_columns}\n')
+
+    filtered_df = compact_frame(derive_columns(df))
+    filtered_df['Decade'] = (filtered_df['Year'] // 10) * 10
+    return filtered_df
+
+# --- Aggregate Cube ---
+def build_cube(filtered_df):
+    # Counts and sums per Year, Country, Region, Attack, Weapon and Target Type for the notebooks' rollups
+    cube = AggregateCube.from_events(filtered_df)
+    paths = cube.save()
+    print(f"Aggregate cube of {len(filtered_df)} events in {len(cube.cells)} cells saved to {', '.join(paths)}")
+    return cube
 
-df_cleaned = df.dropna(subset=['nkill', 'decade'])
+# --- Sample Selection ---
+def sample(filtered_df, sampling_fraction=0.1):
+    # Sample 10% of each group by Decade and Region
+    return stratified_sample(filtered_df, ['Decade', 'Region'], frac=sampling_fraction, random_state=1)
 
-decade_distribution = df_cleaned['decade'].value_counts()
-print(f'\nDecade Distribution:\n{decade_distribution}')
+def merge_gdp(filtered_df, gdp_lookup):
+    merged_df = gdp_lookup.attach(filtered_df)
 
-# --- Dimension Reduction ---
-df['attacktype1'] = df['attacktype1'].replace('', np.nan).fillna('Unknown')
-df['weaptype1'] = df['weaptype1'].replace('', np.nan).fillna('Unknown')
+    merged_df = merged_df.drop(columns=['Country'])
+    merged_df = compact_frame(merged_df)
 
-# One-hot encode only the 'attacktype1' and 'weaptype1' columns
-attack_weap_dummies = pd.get_dummies(df[['attacktype1', 'weaptype1']], drop_first=True)
+    paths = artifacts.store.save(merged_df, PREPROCESSED_ARTIFACT)
 
-other_features = df[['nperps', 'nkill', 'suicide', 'success']]
-features = pd.concat([other_features, attack_weap_dummies], axis=1)
-features = features.applymap(lambda x: np.nan if x < 0 else x)
-features.fillna(features.median(), inplace=True)
+    print(f'Data saved to {", ".join(paths)} with selected columns, new names, and GDP information.')
 
-scaler = StandardScaler()
-features[['nperps', 'nkill']] = scaler.fit_transform(features[['nperps', 'nkill']])
-pca = PCA(n_components=2)
-reduced_features = pca.fit_transform(features)
-reduced_df = pd.DataFrame(data=reduced_features, columns=['PC1', 'PC2'])
+    print("Type of Attributes Classification:")
+    for attribute_type, columns in attribute_classification.items():
+        print(f"\n{attribute_type} Attributes:")
+        for col in columns:
+            print(f" - {col}")
+    return merged_df
 
-print(pca.explained_variance_ratio_)
-output_file_path = 'PCA_Analysis.csv'
-reduced_df.to_csv(output_file_path, index=False)
+# --- Discretization ---
+def discretization_counts(df):
+    """Events per victim range and per decade (of the rows with a kill count); counts of chunks can be added up."""
+    bins = [0, 10, 100, 500, 1000, 1570]
+    labels = ['0-10', '11-100', '101-500', '501-1000', '1001-1570']
+    victim_range = pd.cut(df['nkill'], bins=bins, labels=labels, right=True)
+    victim_distribution = victim_range[df['nkill'].notna()].dropna().value_counts()
+
+    # Decade Distribution
+    bins_decades = [1970, 1980, 1990, 2000, 2010, 2020]  
+    labels_decades = ['1970s', '1980s', '1990s', '2000s', '2010s']  
+    decade = pd.cut(df['iyear'], bins=bins_decades, labels=labels_decades, right=False)
+    decade_distribution = decade[df['nkill'].notna()].dropna().value_counts()
+    return victim_distribution, decade_distribution
+
+def discretize(df):
+    victim_distribution, decade_distribution = discretization_counts(df)
+    print(f'\nBinning:\n{victim_distribution}')
+    print(f'\nDecade Distribution:\n{decade_distribution}')
 
-# --- Detecting Anomalies ---
-# ---- Contextual Anomalies ----
-kla_rows = filtered_df[filtered_df['Attacking Group Name'].str.contains("KLA", na=False)]
-removed_count = kla_rows.shape[0]
-filtered_df = filtered_df[~filtered_df['Attacking Group Name'].str.contains("KLA", na=False)]
-print(f"\n\n-------------------------------------------------------------------------------\n")
-print(f"Detecting Anomalies \n\n")
+# --- Dimension Reduction ---
+def reduce_dimensions(df, n_components=2, categorical_columns=('attacktype1', 'weaptype1')):
+    from sklearn.decomposition import PCA
+    from features import build_feature_matrix
 
-print(f"Detecting and handling Contextual Anomalies")
-print(f"\n{removed_count} rows removed where 'KLA' is considered as terrorist organisation.\n\n")
+    # One-hot encode the categorical columns as a sparse block next to the numeric features
+    features, feature_names = build_feature_matrix(
+        df, numeric_columns=pca_numeric_columns, categorical_columns=categorical_columns,
+        scale_columns=pca_scale_columns, drop_first=True
+    )
 
-# ---- Proximity-Based outlier detection ----
-file_path = "Preprocessed_Global_Terrorism_Dataset.csv" 
-df = pd.read_csv(file_path)
+    # The covariance solver centers the sparse matrix implicitly instead of densifying it
+    pca = PCA(n_components=n_components, svd_solver='covariance_eigh')
+    reduced_features = pca.fit_transform(features)
+    reduced_df = pd.DataFrame(data=reduced_features, columns=[f'PC{i + 1}' for i in range(n_components)])
 
-print("\nProximity-based outlier detection for 'Number of Killed US People', 'Number of Wounded US People'")
-feature_columns = ['Number of Killed US People', 'Number of Wounded US People']
+    print(pca.explained_variance_ratio_)
+    artifacts.store.save(reduced_df, PCA_ARTIFACT)
+    return reduced_df
 
-df_filtered = df[feature_columns].replace(-99, None).dropna()
+# --- Detecting Anomalies ---
+# ---- Contextual Anomalies ----
+def remove_contextual_anomalies(filtered_df, rules_file=RULES_JSON):
+    """Drop the rows flagged by the 'contextual' rule set of `rules_file`."""
+    rules = load_rule_sets(rules_file)['contextual']
+    filtered_df, hits = rules.apply(filtered_df)
+    print(f"\n\n-------------------------------------------------------------------------------\n")
+    print(f"Detecting Anomalies \n\n")
+
+    print(f"Detecting and handling Contextual Anomalies")
+    for description, removed_count in rules.describe(hits).items():
+        print(f"\n{removed_count} rows removed {description}.\n\n")
+    return filtered_df
 
-scaler = StandardScaler()
-scaled_features = scaler.fit_transform(df_filtered)
+# ---- Proximity-Based outlier detection ----
+def knn_anomaly_detection(k, scorer, original_data):
+    rows, kth_distances = scorer.top_n(k, n=5)
 
-def knn_anomaly_detection(k, scaled_data, original_data):
-    nbrs = NearestNeighbors(n_neighbors=k + 1)
-    nbrs.fit(scaled_data)
-    
-    distances, indices = nbrs.kneighbors(scaled_data)
-    kth_distances = distances[:, -1]
-    
-    original_data['kth_distance'] = kth_distances
-    
-    top_anomalies = original_data.sort_values('kth_distance', ascending=False).head(5)
+    top_anomalies = original_data.iloc[rows].copy()
+    top_anomalies['kth_distance'] = kth_distances
     
     print(f"\nTop 5 anomalies with k = {k}:")
     print(top_anomalies[['kth_distance'] + feature_columns])
 
-for k in [1, 20]:
-    knn_anomaly_detection(k, scaled_features, df_filtered.copy())
+def proximity_based_anomalies(merged_df, k_values=(1, 20), n_jobs=None):
+    from sklearn.preprocessing import StandardScaler
+    from anomaly_detection import KNNOutlierScorer
+
+    print("\nProximity-based outlier detection for 'Number of Killed US People', 'Number of Wounded US People'")
+
+    df_filtered = merged_df[feature_columns].replace(-99, np.nan).dropna()
+
+    scaler = StandardScaler()
+    scaled_features = scaler.fit_transform(df_filtered)
+
+    # One tree over the de-duplicated points answers every k
+    scorer = KNNOutlierScorer(n_jobs=n_jobs).fit(scaled_features)
+    for k in k_values:
+        knn_anomaly_detection(k, scorer, df_filtered)
 
-def statistical_anomaly_detection_z_score(data, column, threshold=3):
+def statistical_anomaly_detection_z_score(data, column, threshold=3, by=None, robust=False):
     valid_data = data[data[column] != -99].copy()
-    
-    mean = valid_data[column].mean()
-    std = valid_data[column].std()
-    
-    valid_data['Z Score'] = (valid_data[column] - mean) / std
+
+    # Baselines per group of `by` (a single global group when empty)
+    codes = group_codes(valid_data, by)
+    valid_data['Z Score'] = grouped_z_scores(valid_data[column], codes, robust)
     anomalies = valid_data[np.abs(valid_data['Z Score']) > threshold]
     
     anomaly_percentage = (len(anomalies) / len(valid_data)) * 100 if len(valid_data) > 0 else 0
-    print(f"\nStatistical-Based Anomalies using Z-Score for {column}: {anomaly_percentage:.2f}%")
+    baseline = f" per {', '.join(by)}" if by else ""
+    print(f"\nStatistical-Based Anomalies using {'Robust ' if robust else ''}Z-Score for {column}{baseline}: {anomaly_percentage:.2f}%")
     
     if not anomalies.empty:
         top_5_anomalies = anomalies.assign(abs_score=anomalies['Z Score'].abs()).sort_values('abs_score', ascending=False).head(5)
@@ -289,50 +295,47 @@ def statistical_anomaly_detection_z_score(data, column, threshold=3):
         print("No anomalies found.")
     
     return anomalies
-stat_anomalies_killed = statistical_anomaly_detection_z_score(filtered_df, 'Number of Killed People')
-stat_anomalies_wounded = statistical_anomaly_detection_z_score(filtered_df, 'Duration')
 
-def detect_highest_anomaly_grubbs(data, column, significance_level=0.05):
+def statistical_anomalies(contextual_df, threshold=3, by=('Region', 'Decade'), robust=False):
+    stat_anomalies_killed = statistical_anomaly_detection_z_score(contextual_df, 'Number of Killed People', threshold, by, robust)
+    stat_anomalies_wounded = statistical_anomaly_detection_z_score(contextual_df, 'Duration', threshold, by, robust)
+    return stat_anomalies_killed, stat_anomalies_wounded
+
+def detect_anomalies_generalized_esd(data, column, significance_level=0.05, by=None, max_outliers=10):
     cleaned_data = data[data[column] != -99].copy()
-    print("\nStatistical-Based Anomalies using Grubb's Test for Number of Wounded People")
+    baseline = f" per {', '.join(by)}" if by else ""
+    print(f"\nStatistical-Based Anomalies using Generalized ESD (Grubb's Test) for {column}{baseline}")
 
-    mean = cleaned_data[column].mean()
-    std_dev = cleaned_data[column].std()
-    n = len(cleaned_data)
+    codes = group_codes(cleaned_data, by)
+    outliers, statistics = generalized_esd(cleaned_data[column], codes, max_outliers, significance_level)
+    cleaned_data['G'] = statistics
 
-    G = abs(cleaned_data[column].max() - mean) / std_dev
-    t_critical = t.ppf(1 - significance_level / (2 * n), n - 2)
-    critical_value = ((n - 1) / np.sqrt(n)) * np.sqrt(t_critical**2 / (n - 2 + t_critical**2))
+    n_groups = len(np.unique(codes[codes >= 0]))
+    n_flagged = len(np.unique(codes[outliers]))
+    print(f"n = {len(cleaned_data)}, groups = {n_groups}, α = {significance_level}, "
+          f"up to {max_outliers} outliers per group: {outliers.sum()} outliers in {n_flagged} groups")
+    return cleaned_data[outliers].sort_values('G', ascending=False)
 
-    print(f"n = {n}, α = {significance_level}, Gmax = {G:.4f}, G critical = {critical_value:.4f}")
+def grubbs_anomaly(contextual_df, significance_level=0.05, by=('Region', 'Decade'), max_outliers=10):
+    anomalies = detect_anomalies_generalized_esd(contextual_df, 'Number of Wounded People', significance_level,
+                                                 by, max_outliers)
 
-    if G > critical_value:
-        anomaly_value = cleaned_data[column].max()
-        anomaly_row = data[data[column] == anomaly_value].iloc[0]
-        print("\nHighest Anomaly Detected:")
-        print(f"Detected anomaly: {anomaly_value}")
-        return anomaly_row
+    if not anomalies.empty:
+        print("\nTop 5 anomalies by highest test statistic:")
+        print(anomalies[['Year', 'Region', 'Country', 'Number of Wounded People', 'G']].head(5))
     else:
-        print("No anomaly detected.")
-        return None
-
-
-highest_anomaly = detect_highest_anomaly_grubbs(filtered_df, 'Number of Wounded People')
-
-if highest_anomaly is not None:
-    print("\nSummary of the highest detected anomaly:")
-    print(f"Year: {highest_anomaly['Year']}, Region: {highest_anomaly['Region']}, "
-          f"Number of Wounded People: {highest_anomaly['Number of Wounded People']}")
-else:
-    print("\nNo anomalies detected.")
+        print("\nNo anomalies detected.")
 
 # --- Density Based Anomaly Detection ---
 def density_based_anomaly_detection(data, columns, n_neighbors=20):
+    from anomaly_detection import weighted_local_outlier_factor
+
     valid_data = data[(data[columns] != -99).all(axis=1)][columns].dropna().copy()
     
-    lof = LocalOutlierFactor(n_neighbors=n_neighbors, metric='euclidean')
-    valid_data['density_score'] = lof.fit_predict(valid_data)
-    valid_data['Anomaly Score'] = -lof.negative_outlier_factor_
+    # LOF on the unique (killed, duration) points, broadcast back to every row
+    labels, outlier_factors = weighted_local_outlier_factor(valid_data, n_neighbors)
+    valid_data['density_score'] = labels
+    valid_data['Anomaly Score'] = outlier_factors
 
     anomalies = valid_data[valid_data['density_score'] == -1].copy()
 
@@ -349,11 +352,14 @@ def density_based_anomaly_detection(data, columns, n_neighbors=20):
 
     return anomalies
 
-density_combo = ['Number of Killed People', 'Duration']
-density_anomalies = density_based_anomaly_detection(filtered_df, density_combo)
+def lof_anomalies(contextual_df, n_neighbors=20):
+    return density_based_anomaly_detection(contextual_df, density_combo, n_neighbors)
 
 # --- Clustering Based Anomaly Detection ---
 def clustering_based_anomaly_detection(data, columns, eps=0.8, min_samples=10):
+    from anomaly_detection import weighted_dbscan_labels
+    from features import build_feature_matrix
+
     for col in ['Year', 'Country', 'Weapon Type', 'Attack Type']:
         if col not in data.columns:
             data[col] = '-'
@@ -364,10 +370,12 @@ def clustering_based_anomaly_detection(data, columns, eps=0.8, min_samples=10):
         return None
 
     
-    valid_data = pd.get_dummies(data[available_columns].dropna())
-    
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    valid_data['cluster'] = dbscan.fit_predict(valid_data)
+    valid_data = data[available_columns].dropna()
+
+    # The one-hot rows only take a few hundred distinct values; cluster those with their counts as weights
+    unique_features, _, inverse, counts = build_feature_matrix(valid_data, categorical_columns=available_columns,
+                                                               deduplicate=True)
+    valid_data = valid_data.assign(cluster=weighted_dbscan_labels(unique_features, eps, min_samples, inverse, counts))
     
     anomalies = valid_data[valid_data['cluster'] == -1].copy()
     
@@ -386,50 +394,113 @@ def clustering_based_anomaly_detection(data, columns, eps=0.8, min_samples=10):
     
     return anomalies
 
-clustering_combo = ['Weapon Type', 'Attack Type']
-cluster_anomalies = clustering_based_anomaly_detection(filtered_df, clustering_combo)
-
-required_columns = ['Anomaly Score', 'Z Score', 'Detection Method', 'Year', 'Country', 'Number of Killed People', 'Duration', 'Weapon Type', 'Attack Type']
-default_value = '-'
-
-for anomalies_df, detection_method in [
-    (stat_anomalies_killed, 'Statistical Z-Score (Killed)'),
-    (stat_anomalies_wounded, 'Statistical Z-Score (Wounded)'),
-    (density_anomalies, 'Density-Based'),
-    (cluster_anomalies, 'Clustering-Based')
-]:
-    for col in required_columns:
-        if col not in anomalies_df.columns:
-            anomalies_df[col] = default_value 
-    anomalies_df['Detection Method'] = detection_method
-
-all_anomalies_combined = pd.concat(
-    [
-        stat_anomalies_killed[required_columns],
-        stat_anomalies_wounded[required_columns],
-        density_anomalies[required_columns],
-        cluster_anomalies[required_columns]
-    ],
-    axis=0
-).reset_index(drop=True)
-
-output_csv_path = 'Detected_Anomalies.csv'
-all_anomalies_combined.to_csv(output_csv_path, index=False)
-print(f"Anomalies saved to {output_csv_path}")
+def dbscan_anomalies(contextual_df, eps=0.8, min_samples=10):
+    return clustering_based_anomaly_detection(contextual_df.copy(), clustering_combo, eps, min_samples)
+
+def combine_anomalies(stat_anomalies_killed, stat_anomalies_wounded, density_anomalies, cluster_anomalies):
+    # Columns a detector does not report are missing values, shown as '-' in the CSV export
+    default_value = np.nan
+
+    detected = []
+    for anomalies_df, detection_method in [
+        (stat_anomalies_killed, 'Statistical Z-Score (Killed)'),
+        (stat_anomalies_wounded, 'Statistical Z-Score (Wounded)'),
+        (density_anomalies, 'Density-Based'),
+        (cluster_anomalies, 'Clustering-Based')
+    ]:
+        anomalies_df = anomalies_df.copy()
+        for col in anomaly_columns:
+            if col not in anomalies_df.columns:
+                anomalies_df[col] = default_value 
+        anomalies_df['Detection Method'] = detection_method
+        detected.append(anomalies_df[anomaly_columns])
+
+    all_anomalies_combined = pd.concat(detected, axis=0).reset_index(drop=True)
+
+    paths = artifacts.store.save(all_anomalies_combined, ANOMALIES_ARTIFACT, null_string='-')
+    print(f"Anomalies saved to {', '.join(paths)}")
+    return all_anomalies_combined
 
 # --- Clean out data ---
-filtered_df_cleaned = filtered_df[
-    ((filtered_df['Duration'] >= 1) | (filtered_df['Duration'] == -99)) & (filtered_df['Duration'] != 7324)
-]
-filtered_df_cleaned = filtered_df_cleaned[~(
-    ((filtered_df_cleaned['Weapon Type'] == 'Chemical') & (filtered_df_cleaned['Attack Type'] == 'Armed Assault')) |
-    ((filtered_df_cleaned['Weapon Type'] == 'Explosives') & (filtered_df_cleaned['Attack Type'] == 'Unarmed Assault')) |
-    ((filtered_df_cleaned['Weapon Type'] == 'Melee') & (filtered_df_cleaned['Attack Type'] == 'Bombing/Explosion')) |
-    ((filtered_df_cleaned['Weapon Type'] == 'Fake Weapons') & (filtered_df_cleaned['Attack Type'] == 'Bombing/Explosion')) |
-    ((filtered_df_cleaned['Weapon Type'] == 'Fake Weapons') & (filtered_df_cleaned['Attack Type'] == 'Facility/Infrastructure'))
-)]
-
-cleaned_output_path = 'Filtered_Global_Terrorism_Dataset.csv'
-filtered_df_cleaned.to_csv(cleaned_output_path, index=False)
-
-print(f"Filtered dataset saved to {cleaned_output_path}")
+def clean(contextual_df, rules_file=RULES_JSON):
+    """Drop the rows flagged by the 'cleaning' rule set of `rules_file` (Duration range, Weapon x Attack pairs)."""
+    rules = load_rule_sets(rules_file)['cleaning']
+    filtered_df_cleaned, hits = rules.apply(contextual_df)
+    for description, removed_count in rules.describe(hits).items():
+        print(f"{removed_count} rows removed {description}.")
+
+    paths = artifacts.store.save(filtered_df_cleaned, FILTERED_ARTIFACT)
+
+    print(f"Filtered dataset saved to {', '.join(paths)}")
+    return filtered_df_cleaned
+
+
+def build_pipeline():
+    """The preprocessing and anomaly detection stages, in the order of the original script."""
+    return Pipeline([
+        Stage('extract', extract, outputs=['df'], params={'dataset_zip': DATASET_ZIP, 'columns': tuple(extract_columns)},
+              files=[DATASET_ZIP]),
+        Stage('gdp', build_gdp, inputs=['df'], outputs=['gdp_lookup'],
+              files=[MADDISON_ZIP, WORLD_BANK_ZIP, 'preprocess_gdp_dataset.py'], artifacts=artifacts.store.paths(GDP_ARTIFACT)),
+        Stage('quality', quality_report, params={'dataset_zip': DATASET_ZIP, 'chunksize': 50_000}, files=[DATASET_ZIP]),
+        Stage('select', select_and_derive, inputs=['df'], outputs=['filtered_df']),
+        Stage('cube', build_cube, inputs=['filtered_df'], outputs=['cube'], artifacts=artifacts.store.paths(CUBE_ARTIFACT)),
+        Stage('sample', sample, inputs=['filtered_df'], outputs=['sampled_df'], params={'sampling_fraction': 0.1}),
+        Stage('gdp_merge', merge_gdp, inputs=['filtered_df', 'gdp_lookup'], outputs=['merged_df'],
+              artifacts=artifacts.store.paths(PREPROCESSED_ARTIFACT)),
+        Stage('discretize', discretize, inputs=['df']),
+        Stage('pca', reduce_dimensions, inputs=['df'], outputs=['reduced_df'], params={'n_components': 2, 'categorical_columns': ('attacktype1', 'weaptype1')},
+              artifacts=artifacts.store.paths(PCA_ARTIFACT)),
+        Stage('contextual', remove_contextual_anomalies, inputs=['filtered_df'], outputs=['contextual_df'],
+              params={'rules_file': RULES_JSON}, files=[RULES_JSON]),
+        Stage('knn', proximity_based_anomalies, inputs=['merged_df'], params={'k_values': (1, 20)}, parallel=True,
+              columns={'merged_df': feature_columns}),
+        Stage('zscore', statistical_anomalies, inputs=['contextual_df'],
+              outputs=['stat_anomalies_killed', 'stat_anomalies_wounded'],
+              params={'threshold': 3, 'by': ('Region', 'Decade'), 'robust': False}, parallel=True,
+              columns={'contextual_df': anomaly_columns}),
+        Stage('grubbs', grubbs_anomaly, inputs=['contextual_df'],
+              params={'significance_level': 0.05, 'by': ('Region', 'Decade'), 'max_outliers': 10}, parallel=True,
+              columns={'contextual_df': ['Year', 'Region', 'Country', 'Number of Wounded People']}),
+        Stage('lof', lof_anomalies, inputs=['contextual_df'], outputs=['density_anomalies'],
+              params={'n_neighbors': 20}, parallel=True, columns={'contextual_df': density_combo + ['Year', 'Country']}),
+        Stage('dbscan', dbscan_anomalies, inputs=['contextual_df'], outputs=['cluster_anomalies'],
+              params={'eps': 0.8, 'min_samples': 10}, parallel=True,
+              columns={'contextual_df': clustering_combo + ['Year', 'Country']}),
+        Stage('anomalies', combine_anomalies,
+              inputs=['stat_anomalies_killed', 'stat_anomalies_wounded', 'density_anomalies', 'cluster_anomalies'],
+              outputs=['all_anomalies'], artifacts=artifacts.store.paths(ANOMALIES_ARTIFACT)),
+        Stage('clean', clean, inputs=['contextual_df'], outputs=['cleaned_df'], params={'rules_file': RULES_JSON},
+              files=[RULES_JSON], artifacts=artifacts.store.paths(FILTERED_ARTIFACT)),
+    ])
+
+def with_extract_columns(params):
+    """`params` with the columns `extract` reads extended by the PCA's `categorical_columns`, so
+    overriding them (e.g. adding 'targtype1') loads those columns too."""
+    categorical_columns = params.get('pca', {}).get('categorical_columns', ())
+    missing = [col for col in categorical_columns if col not in extract_columns]
+    if not missing or 'columns' in params.get('extract', {}):
+        return params
+    return {**params, 'extract': {**params.get('extract', {}), 'columns': tuple(extract_columns + missing)}}
+
+def parse_params(assignments):
+    """Turn ['dbscan.eps=0.5', ...] into {'dbscan': {'eps': 0.5}}, adding the columns the overrides need to `extract`."""
+    params = {}
+    for assignment in assignments:
+        key, _, value = assignment.partition('=')
+        stage_name, _, param_name = key.partition('.')
+        if not (value and stage_name and param_name):
+            raise ValueError(f"--param expects STAGE.NAME=VALUE, got '{assignment}'")
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        params.setdefault(stage_name, {})[param_name] = value
+    return with_extract_columns(params)
+
+
+if __name__ == '__main__':
+    # `python preprocessing.py [stages] [options]` is `python cli.py run [stages] [options]`
+    from cli import main
+
+    main(['run', *sys.argv[1:]])
@@ -0,0 +1,143 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def _column_codes(series):
+    """Integer codes (-1 for missing) and the distinct values they index."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series)
+    return codes, uniques
+
+
+class PairRule:
+    """Flags rows whose (left, right) values are one of the forbidden pairs.
+
+    The pairs are compiled to a boolean matrix indexed by the two columns'
+    codes, with an extra last row and column for missing values, so the rule is
+    a single fancy-indexing lookup however many pairs it lists.
+    """
+
+    def __init__(self, name, columns, pairs, description=None):
+        self.name = name
+        self.columns = list(columns)
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.description = description or name
+
+    def mask(self, codes):
+        (left_codes, left_values), (right_codes, right_values) = (codes(column) for column in self.columns)
+        forbidden = np.zeros((len(left_values) + 1, len(right_values) + 1), dtype=bool)
+        left = pd.Index(left_values).get_indexer([left for left, _ in self.pairs])
+        right = pd.Index(right_values).get_indexer([right for _, right in self.pairs])
+        present = (left >= 0) & (right >= 0)
+        forbidden[left[present], right[present]] = True
+        # Code -1 (missing) selects the last row/column, which stays False
+        return forbidden[left_codes, right_codes]
+
+
+class PatternRule:
+    """Flags rows whose column matches a pattern, evaluated once per distinct value and broadcast by code."""
+
+    def __init__(self, name, column, pattern, regex=True, case=True, description=None):
+        self.name = name
+        self.column = column
+        self.pattern = pattern
+        self.regex = regex
+        self.case = case
+        self.description = description or name
+
+    def mask(self, codes):
+        column_codes, values = codes(self.column)
+        matches = pd.Series(np.asarray(values, dtype=object)).str.contains(
+            self.pattern, regex=self.regex, case=self.case, na=False).to_numpy(dtype=bool)
+        return np.append(matches, False)[column_codes]
+
+
+class RangeRule:
+    """Flags rows whose value is outside [min, max] (unless listed in `allow`) or listed in `forbid`."""
+
+    def __init__(self, name, column, min=None, max=None, allow=(), forbid=(), description=None):
+        self.name = name
+        self.column = column
+        self.min = min
+        self.max = max
+        self.allow = list(allow)
+        self.forbid = list(forbid)
+        self.description = description or name
+
+    def mask(self, codes):
+        values = codes.data[self.column].to_numpy(dtype=np.float64, na_value=np.nan)
+        inside = ~np.isnan(values)
+        if self.min is not None:
+            inside &= values >= self.min
+        if self.max is not None:
+            inside &= values <= self.max
+        return ~(inside | np.isin(values, self.allow)) | np.isin(values, self.forbid)
+
+
+RULE_TYPES = {'pairs': PairRule, 'pattern': PatternRule, 'range': RangeRule}
+
+
+class _CodeCache:
+    """Codes of each column, computed at most once per evaluation and shared by the rules."""
+
+    def __init__(self, data):
+        self.data = data
+        self.cache = {}
+
+    def __call__(self, column):
+        if column not in self.cache:
+            self.cache[column] = _column_codes(self.data[column])
+        return self.cache[column]
+
+
+class RuleSet:
+    """Declarative row filters applied in one pass over the data.
+
+    Rules only look at column codes and per-value lookups, so each rule costs
+    one array operation regardless of how many pairs or values it lists, and
+    columns used by several rules are factorized once.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    @classmethod
+    def from_config(cls, entries):
+        """Rule set from a list of dicts such as {"type": "pairs", "name": ..., "columns": [...], "pairs": [...]}."""
+        rules = []
+        for entry in entries:
+            entry = dict(entry)
+            rule_type = entry.pop('type')
+            if rule_type not in RULE_TYPES:
+                raise ValueError(f"Unknown rule type '{rule_type}'. Available types: {list(RULE_TYPES)}")
+            rules.append(RULE_TYPES[rule_type](**entry))
+        return cls(rules)
+
+    def evaluate(self, data):
+        """Rows flagged by any rule, and the number of rows each rule flags."""
+        codes = _CodeCache(data)
+        flagged = np.zeros(len(data), dtype=bool)
+        hits = {}
+        for rule in self.rules:
+            mask = rule.mask(codes)
+            hits[rule.name] = int(mask.sum())
+            flagged |= mask
+        return flagged, pd.Series(hits, dtype=np.int64, name='Rows Flagged')
+
+    def apply(self, data):
+        """The rows no rule flags, and the per-rule hit counts."""
+        flagged, hits = self.evaluate(data)
+        return data[~flagged], hits
+
+    def describe(self, hits):
+        return {rule.description: hits[rule.name] for rule in self.rules}
+
+
+def load_rule_sets(path):
+    """Named rule sets from a JSON file: {"set name": [rule, ...], ...}."""
+    with open(path) as file:
+        config = json.load(file)
+    return {name: RuleSet.from_config(entries) for name, entries in config.items()}
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+def _stratum_codes(data, by):
+    """Dense stratum code of every row, numbered in sorted key order (-1 where a key is missing)."""
+    combined = np.zeros(len(data), dtype=np.int64)
+    valid = np.ones(len(data), dtype=bool)
+    for col in by:
+        col_codes, uniques = pd.factorize(data[col], sort=True)
+        valid &= col_codes >= 0
+        combined = combined * len(uniques) + col_codes
+    codes = np.full(len(data), -1, dtype=np.int64)
+    codes[valid] = pd.factorize(combined[valid], sort=True)[0]
+    return codes
+
+def _shuffle_within_groups(codes, rng):
+    """Random order of the rows grouped by code, and every row's position inside its group.
+
+    A random permutation followed by a stable sort on the codes shuffles every group
+    at once; codes are narrowed so NumPy can use its linear-time radix sort.
+    """
+    valid = np.flatnonzero(codes >= 0)
+    permutation = valid[rng.permutation(len(valid))]
+    permuted_codes = codes[permutation]
+    narrow = np.min_scalar_type(max(int(permuted_codes.max(initial=0)), 1))
+    order = permutation[np.argsort(permuted_codes.astype(narrow), kind='stable')]
+
+    sorted_codes = codes[order]
+    sizes = np.bincount(sorted_codes)
+    positions = np.arange(len(order)) - (np.cumsum(sizes) - sizes)[sorted_codes]
+    return order, sorted_codes, positions, sizes
+
+def _allocate(sizes, frac=None, n=None, total=None):
+    """Rows to draw from each stratum: a fraction, a fixed number, or a proportional share of `total`."""
+    if sum(option is not None for option in (frac, n, total)) != 1:
+        raise ValueError("Specify exactly one of frac, n or total.")
+    if frac is not None:
+        quotas = np.array([round(frac * size) for size in sizes])
+    elif n is not None:
+        quotas = np.full(len(sizes), n)
+    else:
+        # Largest remainder method, so the quotas add up to exactly `total`
+        shares = total * sizes / sizes.sum()
+        quotas = np.floor(shares).astype(np.int64)
+        remainder = int(min(total, sizes.sum()) - quotas.sum())
+        quotas[np.argsort(-(shares - quotas), kind='stable')[:remainder]] += 1
+    return np.minimum(quotas, sizes)
+
+def stratified_sample(data, by, frac=None, n=None, total=None, random_state=None):
+    """Stratified sample without replacement, drawn for all strata in one vectorized pass.
+
+    The rows of every stratum are shuffled at once and the first quota rows of each
+    stratum are kept. Use `frac` for the same fraction of every stratum,
+    `n` for a fixed number per stratum or `total` for proportional allocation.
+    Strata come out in sorted key order, rows in random order within each stratum,
+    as with `groupby(by).apply(lambda x: x.sample(...))`.
+    """
+    rng = np.random.default_rng(random_state)
+    order, sorted_codes, positions, sizes = _shuffle_within_groups(_stratum_codes(data, list(by)), rng)
+    quotas = _allocate(sizes, frac, n, total)
+    return data.iloc[order[positions < quotas[sorted_codes]]].reset_index(drop=True)
+
+
+class StratifiedReservoirSampler:
+    """Streaming stratified sampler for chunked input that may not fit in memory.
+
+    With `n`, each stratum keeps the `n` rows with the smallest random keys seen so
+    far (bottom-k sampling), which is a uniform sample without replacement of the
+    whole stream. With `frac`, rows are kept independently when their key is below
+    `frac` (Bernoulli sampling), so stratum sizes are `frac` of the input in
+    expectation; the kept chunks are concatenated once, when the sample is taken.
+    Keys come from one seeded generator, so the sample does not depend on how the
+    input is chunked.
+    """
+
+    def __init__(self, by, n=None, frac=None, random_state=None):
+        if (n is None) == (frac is None):
+            raise ValueError("Specify exactly one of n or frac.")
+        self.by = list(by)
+        self.n = n
+        self.frac = frac
+        self.rng = np.random.default_rng(random_state)
+        self.reservoir = None
+        self.kept = []
+
+    def update(self, chunk):
+        chunk = chunk.assign(_sample_key=self.rng.random(len(chunk)))
+        if self.frac is not None:
+            # Rows without a stratum are left out, as in the bottom-k mode
+            self.kept.append(chunk[(chunk['_sample_key'] < self.frac) & chunk[self.by].notna().all(axis=1)])
+            return self
+
+        candidates = chunk if self.reservoir is None else pd.concat([self.reservoir, chunk], ignore_index=True)
+        codes = _stratum_codes(candidates, self.by)
+        keys = candidates['_sample_key'].to_numpy()
+        # Rank by key inside each stratum: keys lie in [0, 1), so codes + keys sorts by stratum first
+        order = np.argsort(np.where(codes >= 0, codes + keys, np.inf), kind='stable')[:np.count_nonzero(codes >= 0)]
+        sorted_codes = codes[order]
+        sizes = np.bincount(sorted_codes)
+        positions = np.arange(len(order)) - (np.cumsum(sizes) - sizes)[sorted_codes]
+        self.reservoir = candidates.iloc[order[positions < self.n]].reset_index(drop=True)
+        return self
+
+    def sample(self):
+        reservoir = pd.concat(self.kept, ignore_index=True) if self.kept else self.reservoir
+        if reservoir is None:
+            return pd.DataFrame()
+        return (reservoir.sort_values(self.by + ['_sample_key'], kind='stable')
+                .drop(columns='_sample_key').reset_index(drop=True))
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+
+def group_codes(data, by=None):
+    """Dense group number of every row (-1 where a key is missing); a single group when `by` is empty."""
+    if not by:
+        return np.zeros(len(data), dtype=np.int64)
+    return data.groupby(list(by), observed=True, sort=True).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+def _segment_medians(values, codes, n_groups):
+    """Median of every group, from one lexsort of (code, value) and the middle positions of each segment."""
+    ordered = values[np.lexsort((values, codes))]
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    medians = np.full(n_groups, np.nan)
+    present = sizes > 0
+    lower = starts[present] + (sizes[present] - 1) // 2
+    upper = starts[present] + sizes[present] // 2
+    medians[present] = (ordered[lower] + ordered[upper]) / 2
+    return medians
+
+def group_statistics(values, codes, n_groups=None):
+    """Count, mean, standard deviation (ddof=1), median, MAD and mean absolute deviation of every group.
+
+    Rows with a negative code or a non-finite value are ignored. All statistics
+    are segment reductions (`np.bincount` and one sort per median), so the cost
+    does not grow with the number of groups.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    if n_groups is None:
+        n_groups = int(codes.max(initial=-1)) + 1
+    valid = (codes >= 0) & np.isfinite(values)
+    values, codes = values[valid], codes[valid]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        count = np.bincount(codes, minlength=n_groups)
+        mean = np.bincount(codes, values, n_groups) / count
+        std = np.sqrt(np.bincount(codes, (values - mean[codes]) ** 2, n_groups) / (count - 1))
+        median = _segment_medians(values, codes, n_groups)
+        absolute_deviation = np.abs(values - median[codes])
+        mad = _segment_medians(absolute_deviation, codes, n_groups)
+        mean_absolute_deviation = np.bincount(codes, absolute_deviation, n_groups) / count
+
+    return pd.DataFrame({
+        'count': count, 'mean': mean, 'std': np.where(count > 1, std, np.nan),
+        'median': median, 'mad': mad, 'mean_absolute_deviation': mean_absolute_deviation
+    })
+
+def grouped_z_scores(values, codes, robust=False):
+    """Z-score of every row against the statistics of its own group.
+
+    With `robust` this is the modified z-score 0.6745 * (x - median) / MAD. Where
+    the MAD is zero (common for count columns) the mean absolute deviation scaled
+    by 1.2533 is used instead. Rows outside any group get NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    stats = group_statistics(values, codes)
+    row_codes = np.where(codes >= 0, codes, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if robust:
+            mad = stats['mad'].to_numpy()
+            scale = np.where(mad > 0, mad / 0.6745, 1.2533 * stats['mean_absolute_deviation'].to_numpy())
+            scores = (values - stats['median'].to_numpy()[row_codes]) / scale[row_codes]
+        else:
+            scores = (values - stats['mean'].to_numpy()[row_codes]) / stats['std'].to_numpy()[row_codes]
+    scores[codes < 0] = np.nan
+    return scores
+
+def esd_critical_values(n, alpha=0.05):
+    """Grubbs / generalized ESD critical values for samples of size `n` (arrays allowed).
+
+    lambda = (n - 1) t / sqrt((n - 2 + t**2) n), with t the 1 - alpha / (2n)
+    quantile of Student's t with n - 2 degrees of freedom. NaN where n < 3.
+    """
+    from scipy.stats import t
+
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_critical = t.ppf(1 - alpha / (2 * n), np.where(n > 2, n - 2, np.nan))
+        return (n - 1) * t_critical / np.sqrt((n - 2 + t_critical ** 2) * n)
+
+def generalized_esd(values, codes, max_outliers=10, alpha=0.05):
+    """Rosner's generalized ESD test (Grubbs' test for up to `max_outliers` outliers), run in every group at once.
+
+    Each step removes the most extreme remaining value of every group, computing
+    the group means and standard deviations with segment reductions and the
+    critical values for all groups with one vectorized `t.ppf` call. A group has
+    as many outliers as the last step whose statistic exceeds its critical value.
+    Returns a boolean outlier mask and the test statistic R of every flagged row
+    (NaN elsewhere).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    n_groups = int(codes.max(initial=-1)) + 1
+    active = (codes >= 0) & np.isfinite(values)
+
+    statistics = np.full((max_outliers, n_groups), np.nan)
+    critical = np.full((max_outliers, n_groups), np.nan)
+    removed = np.full((max_outliers, n_groups), -1, dtype=np.int64)
+
+    for step in range(max_outliers):
+        positions = np.flatnonzero(active)
+        group, x = codes[positions], values[positions]
+        count = np.bincount(group, minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(group, x, n_groups) / count
+            deviation = np.abs(x - mean[group])
+            std = np.sqrt(np.bincount(group, deviation ** 2, n_groups) / (count - 1))
+
+        largest = np.zeros(n_groups)
+        np.maximum.at(largest, group, deviation)
+        # First row of every group that reaches the group's largest deviation
+        candidates = np.flatnonzero(deviation == largest[group])
+        extreme_groups, first = np.unique(group[candidates], return_index=True)
+        extreme = candidates[first]
+
+        testable = (count[extreme_groups] > 2) & (std[extreme_groups] > 0)
+        extreme_groups, extreme = extreme_groups[testable], extreme[testable]
+        if not len(extreme_groups):
+            break
+        statistics[step, extreme_groups] = deviation[extreme] / std[extreme_groups]
+        critical[step, extreme_groups] = esd_critical_values(count[extreme_groups], alpha)
+        removed[step, extreme_groups] = positions[extreme]
+        active[positions[extreme]] = False
+
+    # Outliers per group: the last step at which R exceeds the critical value
+    exceeds = statistics > critical
+    n_outliers = np.where(exceeds.any(axis=0), max_outliers - np.argmax(exceeds[::-1], axis=0), 0)
+    flagged = np.arange(max_outliers)[:, None] < n_outliers[None, :]
+
+    outliers = np.zeros(len(values), dtype=bool)
+    scores = np.full(len(values), np.nan)
+    outliers[removed[flagged]] = True
+    scores[removed[flagged]] = statistics[flagged]
+    return outliers, scores
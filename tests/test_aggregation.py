@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from aggregation import calculate_casualties, calculate_duration
+from benchmark import calculate_casualties_rowwise, calculate_duration_rowwise, make_aggregation_frame
+
+
+def make_edge_cases():
+    rows = [
+        # Year, Month, Day, Extended, Resolution, Killed, Wounded
+        (2001, 2, 28, 1, '03/02/2001', 1.0, 2.0),       # resolved after 2 days
+        (2001, 2, 30, 0, None, 0.0, 0.0),               # invalid attack date
+        (2001, 2, 29, 1, '03/01/2001', 0.0, 0.0),       # not a leap year
+        (2001, 0, 5, 0, None, 3.0, np.nan),             # unknown month
+        (2001, 5, 0, 1, '05/10/2001', np.nan, 4.0),     # unknown day
+        (2000, 2, 29, 1, '02/30/2001', np.nan, np.nan), # leap day, impossible resolution
+        (2001, 1, 1, 1, None, 5.0, 0.0),                # extended without resolution
+        (2001, 1, 1, 0, '01/10/2001', 0.0, 1.0),        # resolution of a non-extended event
+        (2001, 1, 10, 1, '01/05/2001', 2.0, 2.0),       # resolved before the attack
+        (2001, 1, 10, 1, 'unknown', 2.0, 2.0),          # malformed resolution
+    ]
+    return pd.DataFrame(rows, columns=['Year', 'Month', 'Day', 'Extended', 'Resolution',
+                                       'Number of Killed People', 'Number of Wounded People'])
+
+
+def test_duration_edge_cases():
+    data = make_edge_cases()
+    duration = calculate_duration(data)
+    assert duration.tolist() == [2, -99, -99, -99, -99, 1, 1, 1, -5, 1]
+    pd.testing.assert_series_equal(duration, data.apply(calculate_duration_rowwise, axis=1),
+                                   check_names=False, check_dtype=False)
+
+
+def test_casualties_edge_cases():
+    data = make_edge_cases()
+    casualties = calculate_casualties(data)
+    assert casualties.tolist() == [3, 0, 0, -99, -99, -99, 5, 1, 4, 4]
+    pd.testing.assert_series_equal(casualties, data.apply(calculate_casualties_rowwise, axis=1),
+                                   check_names=False, check_dtype=False)
+
+
+def test_matches_rowwise_on_random_rows():
+    data = make_aggregation_frame(2_000, seed=1)
+    pd.testing.assert_series_equal(calculate_duration(data), data.apply(calculate_duration_rowwise, axis=1),
+                                   check_names=False, check_dtype=False)
+    pd.testing.assert_series_equal(calculate_casualties(data), data.apply(calculate_casualties_rowwise, axis=1),
+                                   check_names=False, check_dtype=False)
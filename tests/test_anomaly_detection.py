@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import LocalOutlierFactor, NearestNeighbors
+
+from anomaly_detection import KNNOutlierScorer, weighted_dbscan_labels, weighted_local_outlier_factor
+from features import build_feature_matrix
+
+
+def make_tied_points(seed, n_rows=400):
+    """Integer (killed, duration)-like points: many duplicates and equal distances at the k-distance."""
+    rng = np.random.default_rng(seed)
+    points = np.column_stack([rng.negative_binomial(1, 0.3, n_rows), rng.choice([1, 1, 1, 2, 3, 30], n_rows)])
+    points[:3] = [[60, 1], [0, 400], [25, 25]]
+    return points.astype(np.float64)
+
+
+# sklearn warns that duplicates make LOF unstable; both implementations handle them identically
+@pytest.mark.filterwarnings('ignore:Duplicate values')
+@pytest.mark.parametrize('seed', range(8))
+def test_lof_matches_sklearn_with_tied_neighbours(seed):
+    points = make_tied_points(seed)
+    labels, factors = weighted_local_outlier_factor(points, n_neighbors=20)
+    lof = LocalOutlierFactor(n_neighbors=20)
+    expected_labels = lof.fit_predict(points)
+
+    assert (labels == expected_labels).all()
+    np.testing.assert_allclose(factors, -lof.negative_outlier_factor_, rtol=1e-9)
+
+
+@pytest.mark.filterwarnings('ignore:Duplicate values')
+def test_lof_on_a_grid():
+    # Every interior point has four neighbours at distance 1, so the k-distance ties for most k
+    grid = np.array([[x, y] for x in range(8) for y in range(8)] * 2 + [[20, 20]], dtype=np.float64)
+    for n_neighbors in (3, 5, 10):
+        labels, factors = weighted_local_outlier_factor(grid, n_neighbors)
+        lof = LocalOutlierFactor(n_neighbors=n_neighbors)
+        assert (labels == lof.fit_predict(grid)).all()
+        np.testing.assert_allclose(factors, -lof.negative_outlier_factor_, rtol=1e-9)
+
+
+def test_knn_distances_match_nearest_neighbors():
+    points = make_tied_points(0)
+    distances = KNNOutlierScorer(batch_size=64).fit(points).kth_distances([1, 5, 20])
+    for k, kth in distances.items():
+        expected = NearestNeighbors(n_neighbors=k + 1).fit(points).kneighbors(points)[0][:, -1]
+        np.testing.assert_allclose(kth, expected)
+
+
+def test_dbscan_noise_matches_sklearn():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'Weapon Type': rng.choice(['Explosives', 'Firearms', 'Melee', 'Chemical'], 600, p=[0.5, 0.4, 0.08, 0.02]),
+        'Attack Type': rng.choice(['Bombing/Explosion', 'Armed Assault', 'Hijacking'], 600, p=[0.55, 0.43, 0.02]),
+    })
+    unique_features, _, inverse, counts = build_feature_matrix(data, categorical_columns=list(data.columns),
+                                                               deduplicate=True)
+    labels = weighted_dbscan_labels(unique_features, 0.8, 10, inverse, counts)
+    expected = DBSCAN(eps=0.8, min_samples=10).fit_predict(pd.get_dummies(data).to_numpy(dtype=np.float64))
+    assert ((labels == -1) == (expected == -1)).all()
+    assert (labels == -1).any()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import artifacts
+from cube import AggregateCube
+from preprocessing import derive_columns, selected_columns
+from synthetic_data import SyntheticGTD
+from utils import DATASET_DTYPES, apply_dataset_schema
+
+
+@pytest.fixture(scope='module')
+def events():
+    raw = pd.concat(SyntheticGTD(0.02).chunks(), ignore_index=True)[selected_columns]
+    events = derive_columns(apply_dataset_schema(raw.astype({col: DATASET_DTYPES[col] for col in selected_columns})))
+    events['Decade'] = (events['Year'] // 10) * 10
+    return events
+
+
+def check_queries(events, cube):
+    killed = events['Number of Killed People']
+    queries = [
+        (events.groupby('Decade').size(), cube.query('Decade', ['Attacks'])['Attacks']),
+        (events.groupby('Decade')['Success'].mean(), cube.query('Decade', ['Success'])['Success Rate']),
+        (events[killed >= 0].groupby(['Decade', 'Region'], observed=True)[killed.name].sum(),
+         cube.query(['Decade', 'Region'], ['Killed'])['Killed']),
+        (events[killed >= 0].groupby('Region', observed=True)[killed.name].mean(),
+         cube.query('Region', ['Killed'])['Killed Mean']),
+        (pd.crosstab(events['Region'], events['Attack Type']), cube.crosstab('Region', 'Attack Type')),
+    ]
+    for expected, result in queries:
+        np.testing.assert_allclose(np.asarray(result, dtype=np.float64), np.asarray(expected, dtype=np.float64))
+
+
+def test_queries_match_groupby(events):
+    check_queries(events, AggregateCube.from_events(events))
+
+
+def test_merged_chunk_cubes_match_groupby(events):
+    cubes = [AggregateCube.from_events(events.iloc[start:start + 1_000]) for start in range(0, len(events), 1_000)]
+    cube = cubes[0]
+    for other in cubes[1:]:
+        cube = cube.merge(other)
+    check_queries(events, cube)
+
+
+def test_slice_matches_filtered_events(events):
+    cube = AggregateCube.from_events(events)
+    region = events['Region'].iloc[0]
+    expected = events[(events['Region'] == region) & events['Decade'].isin([1990, 2000])]
+    assert cube.slice(Region=region, Decade=[1990, 2000]).query()['Attacks'].item() == len(expected)
+
+
+def test_saved_cube_answers_the_same_queries(events, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(artifacts, 'store', artifacts.ArtifactStore(export_csv=True))
+    paths = AggregateCube.from_events(events).save()
+    artifacts.store.wait()
+
+    assert sorted(paths) == ['Aggregate_Cube.csv', 'Aggregate_Cube.parquet']
+    check_queries(events, AggregateCube.read())
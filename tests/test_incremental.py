@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental import GroupMoments, ValueCounts
+
+
+def make_rows(n_rows=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Region': rng.choice(['A', 'B', 'C'], n_rows),
+        'Decade': rng.integers(197, 200, n_rows) * 10,
+        'Duration': rng.negative_binomial(1, 0.1, n_rows).astype(np.float64),
+    })
+
+
+@pytest.mark.parametrize('by', [['Region', 'Decade'], ['Region'], []])
+def test_group_moments_match_whole_column(by):
+    data = make_rows()
+    moments = GroupMoments(by)
+    for start in range(0, len(data), 300):
+        moments.update(data.iloc[start:start + 300], 'Duration')
+
+    column = data['Duration']
+    if by:
+        groups = column.groupby([data[col] for col in by])
+        expected = (column - groups.transform('mean')) / groups.transform('std')
+    else:
+        expected = (column - column.mean()) / column.std()
+    np.testing.assert_allclose(moments.z_scores(data, 'Duration'), expected.to_numpy(), rtol=1e-9)
+
+
+def test_value_counts_median():
+    values = make_rows()['Duration']
+    counts = ValueCounts()
+    for start in range(0, len(values), 300):
+        counts.update(values.iloc[start:start + 300])
+    assert counts.median() == values.median()
@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmark import make_rule_frame
+from conftest import ROOT
+from rules import load_rule_sets
+
+TEXT_COLUMNS = ['Attacking Group Name', 'Weapon Type', 'Attack Type']
+
+
+def chained_masks(data):
+    """The contextual and cleaning filters as the original script wrote them."""
+    contextual = data[~data['Attacking Group Name'].str.contains("KLA", na=False)]
+    cleaned = contextual[((contextual['Duration'] >= 1) | (contextual['Duration'] == -99)) & (contextual['Duration'] != 7324)]
+    W, A = cleaned['Weapon Type'], cleaned['Attack Type']
+    cleaned = cleaned[~(((W == 'Chemical') & (A == 'Armed Assault')) | ((W == 'Explosives') & (A == 'Unarmed Assault')) |
+                        ((W == 'Melee') & (A == 'Bombing/Explosion')) | ((W == 'Fake Weapons') & (A == 'Bombing/Explosion')) |
+                        ((W == 'Fake Weapons') & (A == 'Facility/Infrastructure')))]
+    return contextual, cleaned
+
+
+@pytest.mark.parametrize('dtype', ['category', 'object'])
+def test_rules_match_chained_masks(dtype):
+    data = make_rule_frame(3_000)
+    for col in TEXT_COLUMNS:
+        data[col] = data[col].where(data.index >= 5).astype(dtype)
+    rule_sets = load_rule_sets(os.path.join(ROOT, 'rules.json'))
+
+    contextual, hits = rule_sets['contextual'].apply(data)
+    cleaned, _ = rule_sets['cleaning'].apply(contextual)
+    expected_contextual, expected_cleaned = chained_masks(data)
+
+    pd.testing.assert_frame_equal(contextual, expected_contextual)
+    pd.testing.assert_frame_equal(cleaned, expected_cleaned)
+    assert hits.sum() == len(data) - len(contextual)
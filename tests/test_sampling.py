@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from sampling import StratifiedReservoirSampler, stratified_sample
+
+
+def make_strata(n_rows=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'Decade': rng.integers(197, 202, n_rows) * 10,
+        'Region': pd.Categorical(rng.choice([f'Region {i}' for i in range(6)], n_rows)),
+        'Value': np.arange(n_rows),
+    })
+    data.loc[::97, 'Region'] = np.nan
+    return data
+
+
+def test_stratified_sample_matches_groupby_apply():
+    data = make_strata()
+    by = ['Decade', 'Region']
+    sampled = stratified_sample(data, by, frac=0.1, random_state=1)
+    expected = data.groupby(by, observed=True, group_keys=False)[list(data.columns)].apply(
+        lambda x: x.sample(frac=0.1, random_state=1)).reset_index(drop=True)
+
+    # Different random draws, but the same strata sizes in the same order
+    assert (sampled[by].to_numpy() == expected[by].to_numpy()).all()
+    assert not sampled['Value'].duplicated().any()
+
+
+def test_reservoir_sample_does_not_depend_on_chunks():
+    data = make_strata()
+    for options in [{'frac': 0.1}, {'n': 7}]:
+        samples = []
+        for chunksize in (100, 1_234, len(data)):
+            sampler = StratifiedReservoirSampler(['Decade', 'Region'], random_state=1, **options)
+            for start in range(0, len(data), chunksize):
+                sampler.update(data.iloc[start:start + chunksize])
+            samples.append(sampler.sample())
+        for sample in samples[1:]:
+            pd.testing.assert_frame_equal(sample, samples[0])
+        assert samples[0]['Region'].notna().all()
+
+
+def test_reservoir_n_keeps_up_to_n_rows_per_stratum():
+    data = make_strata()
+    sampler = StratifiedReservoirSampler(['Decade', 'Region'], n=7, random_state=0)
+    for start in range(0, len(data), 500):
+        sampler.update(data.iloc[start:start + 500])
+    sizes = sampler.sample().groupby(['Decade', 'Region'], observed=True).size()
+    expected = data.groupby(['Decade', 'Region'], observed=True).size().clip(upper=7)
+    pd.testing.assert_series_equal(sizes, expected)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import generalized_esd_loop
+from statistical_outliers import generalized_esd, group_codes, group_statistics, grouped_z_scores
+
+
+def make_groups(n_rows=3_000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'Region': rng.integers(0, 4, n_rows),
+        'Decade': rng.integers(197, 200, n_rows) * 10,
+        'Number of Wounded People': rng.negative_binomial(1, 0.2, n_rows).astype(np.float64),
+    })
+    # A few extreme values, a constant group and a group of two rows
+    data.loc[[3, 40, 41], 'Number of Wounded People'] = [900, 450, 700]
+    data.loc[len(data)] = [9, 1970, 5.0]
+    data.loc[len(data)] = [9, 1970, 5.0]
+    data.loc[len(data)] = [8, 1980, 1.0]
+    data.loc[len(data)] = [8, 1980, 2.0]
+    return data
+
+
+def test_z_scores_and_esd_match_per_group_loop():
+    data = make_groups()
+    by = ['Region', 'Decade']
+    column = data['Number of Wounded People']
+    groups = data.groupby(by, sort=True)[column.name]
+
+    codes = group_codes(data, by)
+    expected = pd.concat([(values - values.mean()) / values.std() for _, values in groups]).sort_index()
+    np.testing.assert_allclose(grouped_z_scores(column, codes), expected.to_numpy(), rtol=1e-9)
+
+    outliers, _ = generalized_esd(column, codes)
+    assert np.flatnonzero(outliers).tolist() == sorted(index for _, values in groups for index in generalized_esd_loop(values))
+    assert outliers[[3, 40, 41]].all()
+
+
+def test_group_statistics_match_groupby():
+    data = make_groups()
+    column = data['Number of Wounded People']
+    groups = column.groupby([data['Region'], data['Decade']], sort=True)
+    stats = group_statistics(column, group_codes(data, ['Region', 'Decade']))
+
+    np.testing.assert_allclose(stats['count'], groups.count())
+    np.testing.assert_allclose(stats['mean'], groups.mean())
+    np.testing.assert_allclose(stats['std'], groups.std())
+    np.testing.assert_allclose(stats['median'], groups.median())
+    np.testing.assert_allclose(stats['mad'], groups.apply(lambda x: (x - x.median()).abs().median()))
+
+
+def test_empty_by_is_one_group():
+    data = make_groups()
+    column = data['Number of Wounded People']
+    codes = group_codes(data, ())
+    assert (codes == 0).all()
+    np.testing.assert_allclose(grouped_z_scores(column, codes), (column - column.mean()) / column.std())
@@ -1,14 +1,152 @@
+import glob
+import hashlib
+import json
 import zipfile
 import os
 
-def extract_dataset(zip_file_path):
-    csv_file_path = 'globalterrorismdb_0718dist.csv'
-    
-    if not os.path.exists(csv_file_path):
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            zip_ref.extractall()
-            print(f"Extracted: {zip_ref.namelist()[0]}")
-    else:
-        print(f"{csv_file_path} already exists!")
-    
-    return csv_file_path
+import pandas as pd
+
+DATASET_CSV = 'globalterrorismdb_0718dist.csv'
+CACHE_DIR = '.cache'
+
+CATEGORICAL_COLUMNS = ['country_txt', 'region_txt', 'gname', 'dbsource']
+COMPACT_INT_COLUMNS = {'iyear': 'int16', 'imonth': 'int8', 'iday': 'int8'}
+
+# Explicit dtypes for the columns used by the pipeline (selected columns plus PCA inputs)
+DATASET_DTYPES = {
+    'eventid': 'int64', 'iyear': 'int16', 'imonth': 'int8', 'iday': 'int8', 'extended': 'int8',
+    'resolution': 'object', 'country_txt': 'category', 'region_txt': 'category', 'city': 'object',
+    'success': 'int8', 'suicide': 'int8', 'attacktype1': 'int8', 'attacktype1_txt': 'category',
+    'targtype1_txt': 'category', 'natlty1_txt': 'category', 'gname': 'category', 'nperps': 'float64',
+    'weaptype1': 'int8', 'weaptype1_txt': 'category', 'nkill': 'float64', 'nwound': 'float64',
+    'nkillus': 'float64', 'nwoundus': 'float64', 'dbsource': 'category'
+}
+
+def read_dataset(zip_file_path, columns=None, chunksize=None, file_name=DATASET_CSV, dtype=None):
+    """Stream the GTD CSV straight out of the zip, reading only `columns` with explicit dtypes.
+
+    With `chunksize` an iterator of DataFrames is returned so memory stays bounded.
+    `dtype` overrides the default pipeline dtypes (e.g. `str` to keep the raw text).
+    """
+    if dtype is None:
+        dtype = {col: col_type for col, col_type in DATASET_DTYPES.items() if columns is None or col in columns}
+    read_options = {'encoding': 'ISO-8859-1', 'usecols': columns, 'dtype': dtype, 'low_memory': False}
+
+    if chunksize is not None:
+        return _iter_dataset_chunks(zip_file_path, file_name, chunksize, read_options)
+
+    with zipfile.ZipFile(zip_file_path, 'r') as z:
+        with z.open(file_name) as file:
+            return pd.read_csv(file, **read_options)
+
+def _iter_dataset_chunks(zip_file_path, file_name, chunksize, read_options):
+    with zipfile.ZipFile(zip_file_path, 'r') as z:
+        with z.open(file_name) as file:
+            yield from pd.read_csv(file, chunksize=chunksize, **read_options)
+
+def file_fingerprint(file_path, chunk_size=1 << 20):
+    """Size, mtime and SHA-256 of a file, used as the cache key for derived artifacts."""
+    stat = os.stat(file_path)
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(block)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': sha256.hexdigest()}
+
+def _cached_fingerprint(file_path, metadata_path):
+    """Reuse the stored hash while size and mtime are unchanged, otherwise rehash."""
+    stat = os.stat(file_path)
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as file:
+            metadata = json.load(file)
+        if metadata.get('size') == stat.st_size and metadata.get('mtime') == stat.st_mtime_ns:
+            return metadata
+    return file_fingerprint(file_path)
+
+def apply_dataset_schema(df):
+    """Categoricals for the repeated text columns and compact ints for the date parts."""
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS or col.endswith('_txt'):
+            df[col] = df[col].astype('category')
+    for col, dtype in COMPACT_INT_COLUMNS.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def _code_text(code):
+    """Bytecode and constants of a function, nested comprehensions included, without object addresses."""
+    consts = [_code_text(const) if hasattr(const, 'co_code') else const for const in code.co_consts]
+    return code.co_code.hex() + repr(consts)
+
+def code_version(functions, data=()):
+    """Short hash of the code of `functions` and of the (JSON) `data` they depend on, for
+    keying a file cache on the code that writes it."""
+    code = ''.join(_code_text(function.__code__) for function in functions)
+    return hashlib.sha256((json.dumps(data) + code).encode()).hexdigest()[:8]
+
+def schema_version():
+    """Hash of the dtypes and the parsing code the Parquet cache is written with."""
+    return code_version((read_dataset, apply_dataset_schema), [DATASET_DTYPES, CATEGORICAL_COLUMNS, COMPACT_INT_COLUMNS])
+
+def load_dataset(zip_file_path, columns=None, cache_dir=CACHE_DIR):
+    """Load the GTD from a typed Parquet cache keyed on the zip's size, mtime and hash
+    and on the `schema_version`, so editing DATASET_DTYPES or the schema code rebuilds it.
+
+    The first run parses the CSV once and writes the cache; later runs read only
+    the requested columns from it and never touch the CSV.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    metadata_path = os.path.join(cache_dir, 'GlobalTerrorismDataset.json')
+    fingerprint = _cached_fingerprint(zip_file_path, metadata_path)
+    cache_path = os.path.join(cache_dir, f"GlobalTerrorismDataset-{fingerprint['sha256'][:16]}-{schema_version()}.parquet")
+
+    if not os.path.exists(cache_path):
+        for stale_path in glob.glob(os.path.join(cache_dir, 'GlobalTerrorismDataset-*.parquet')):
+            os.remove(stale_path)
+        df = read_dataset(zip_file_path)
+        apply_dataset_schema(df).to_parquet(cache_path, index=False)
+        print(f"Cached dataset to {cache_path}")
+
+    with open(metadata_path, 'w') as file:
+        json.dump(fingerprint, file)
+
+    return pd.read_parquet(cache_path, columns=columns)
+
+def fill_category(series, value):
+    """fillna that also works on categoricals whose categories do not include the fill value."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+def compact_frame(df, category_ratio=0.5, verbose=True):
+    """Shrink a working frame: low-cardinality strings become categoricals, integral
+    numeric columns are downcast to the smallest (nullable) integer type and other
+    floats to float32 where that is lossless. Prints memory before and after."""
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy()
+
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if len(values) and (values % 1 == 0).all():
+                downcast = pd.to_numeric(values, downcast='integer')
+                if series.isna().any():
+                    df[col] = series.astype(downcast.dtype.name.capitalize())
+                else:
+                    df[col] = series.astype(downcast.dtype)
+            else:
+                as_float32 = series.astype('float32')
+                if ((as_float32.astype('float64') == series) | series.isna()).all():
+                    df[col] = as_float32
+        elif series.nunique() <= category_ratio * len(series):
+            df[col] = series.astype('category')
+
+    if verbose:
+        after = df.memory_usage(deep=True).sum()
+        print(f"Compacted frame: {before / 1e6:,.2f} MB -> {after / 1e6:,.2f} MB")
+    return df